@@ -0,0 +1,3 @@
+"""
+Benchmarks of the data pipeline. Each module can be executed by `poetry run python -m benchmarks.<module>`.
+"""
@@ -0,0 +1,63 @@
+"""
+Compare the row-wise and the vectorized explosion of reservations into actions
+"""
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from pipelines.aggregate_data import _reservation2actions, reservations2actions
+
+
+def generate_bookings(n_reservations: int, seed: int = 0) -> pd.DataFrame:
+    """
+    :return: DataFrame[reservation_id, arrival_date, actual_departure_date, n_stay_actual]
+    """
+    rng = np.random.default_rng(seed)
+    arrival_date = pd.Timestamp("2015-07-01") + pd.to_timedelta(rng.integers(0, 793, n_reservations), unit="D")
+    n_stay_actual = rng.integers(1, 15, n_reservations).astype(float)
+
+    return pd.DataFrame(
+        {
+            "reservation_id": [f"C{v:06d}" for v in range(1, n_reservations + 1)],
+            "arrival_date": arrival_date,
+            "actual_departure_date": arrival_date + pd.to_timedelta(n_stay_actual, unit="D"),
+            "n_stay_actual": n_stay_actual,
+        }
+    )
+
+
+def time_it(func, *args) -> (float, pd.DataFrame):
+    start = time.perf_counter()
+    result = func(*args)
+    return time.perf_counter() - start, result
+
+
+def per_row(df_booking: pd.DataFrame) -> pd.DataFrame:
+    return pd.concat(df_booking.apply(_reservation2actions, axis=1).to_list(), axis=0)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1_000, 10_000, 100_000])
+    parser.add_argument("--max-per-row", type=int, default=100_000, help="skip the row-wise path above this size")
+    args = parser.parse_args()
+
+    print(f"{'reservations':>12} {'actions':>10} {'per-row [s]':>12} {'vectorized [s]':>15} {'speed-up':>9}")
+    for size in args.sizes:
+        df_booking = generate_bookings(size)
+        t_vectorized, df_vectorized = time_it(reservations2actions, df_booking)
+
+        if size <= args.max_per_row:
+            t_per_row, df_per_row = time_it(per_row, df_booking)
+            pd.testing.assert_frame_equal(df_per_row, df_vectorized)
+            print(
+                f"{size:>12} {len(df_vectorized):>10} {t_per_row:>12.3f} {t_vectorized:>15.3f} {t_per_row/t_vectorized:>8.0f}x"
+            )
+        else:
+            print(f"{size:>12} {len(df_vectorized):>10} {'-':>12} {t_vectorized:>15.3f} {'-':>9}")
+
+
+if __name__ == "__main__":
+    main()
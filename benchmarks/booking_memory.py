@@ -0,0 +1,49 @@
+"""
+Memory footprint of bookings.parquet with the compact schema against the schema without DataCleaner.compact_dtypes
+"""
+import argparse
+import io
+
+import pandas as pd
+
+from hotels.load_data import load_raw_hotel_data
+from pipelines.clean_data import DataCleaner
+
+
+class NonCompactDataCleaner(DataCleaner):
+    steps = tuple(step for step in DataCleaner.steps if step != "compact_dtypes")
+
+
+def parquet_size(df: pd.DataFrame) -> int:
+    buffer = io.BytesIO()
+    df.to_parquet(buffer)
+    return buffer.getbuffer().nbytes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--input", help="raw data (parquet). The DVC-tracked hotels.parquet is used by default.")
+    args = parser.parse_args()
+
+    data_raw = pd.read_parquet(args.input) if args.input else load_raw_hotel_data()
+    df_before = NonCompactDataCleaner.apply_all(data_raw)
+    df_after = DataCleaner.apply_all(data_raw)
+
+    df_report = pd.DataFrame(
+        {
+            "dtype (before)": df_before.dtypes.astype(str),
+            "dtype (after)": df_after.dtypes.astype(str),
+            "memory (before) [KiB]": df_before.memory_usage(deep=True, index=False) / 1024,
+            "memory (after) [KiB]": df_after.memory_usage(deep=True, index=False) / 1024,
+        }
+    )
+    df_report.loc["total"] = ["", "", df_report["memory (before) [KiB]"].sum(), df_report["memory (after) [KiB]"].sum()]
+    df_report["ratio"] = df_report["memory (after) [KiB]"] / df_report["memory (before) [KiB]"]
+
+    print(f"{len(df_after)} rows")
+    print(df_report.to_string(float_format=lambda v: f"{v:0.2f}"))
+    print(f"parquet file size: {parquet_size(df_before) / 1024:0.0f} KiB -> {parquet_size(df_after) / 1024:0.0f} KiB")
+
+
+if __name__ == "__main__":
+    main()
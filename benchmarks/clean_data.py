@@ -0,0 +1,44 @@
+"""
+Per-step timing report of DataCleaner (vectorized) against RowwiseDataCleaner (reference)
+"""
+import argparse
+
+import pandas as pd
+
+from hotels.load_data import load_raw_hotel_data
+from pipelines.clean_data import DataCleaner, RowwiseDataCleaner
+
+
+def time_steps(cleaner: type[DataCleaner], data_raw: pd.DataFrame) -> (pd.Series, pd.DataFrame):
+    """
+    :return: Series[step -> seconds], cleaned data
+    """
+    step_metrics = []
+    df = cleaner.apply_all(data_raw, step_metrics=step_metrics)
+    s_timings = pd.DataFrame(step_metrics).set_index("step")["wall_time_sec"].rename(cleaner.__name__)
+    return s_timings, df
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--input", help="raw data (parquet). The DVC-tracked hotels.parquet is used by default.")
+    parser.add_argument("--scale", type=int, default=1, help="concatenate the raw data this many times")
+    args = parser.parse_args()
+
+    data_raw = pd.read_parquet(args.input) if args.input else load_raw_hotel_data()
+    data_raw = pd.concat([data_raw] * args.scale, ignore_index=True)
+
+    s_rowwise, df_rowwise = time_steps(RowwiseDataCleaner, data_raw)
+    s_vectorized, df_vectorized = time_steps(DataCleaner, data_raw)
+    pd.testing.assert_frame_equal(df_rowwise, df_vectorized)
+
+    df_report = pd.concat([s_rowwise, s_vectorized], axis=1)
+    df_report.loc["total"] = df_report.sum()
+    df_report["speed-up"] = df_report[RowwiseDataCleaner.__name__] / df_report[DataCleaner.__name__]
+
+    print(f"{len(data_raw)} rows. Time in seconds:")
+    print(df_report.to_string(float_format=lambda v: f"{v:0.4f}"))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+"""
+Import time of the package and the dashboard pages, measured by `python -X importtime` in fresh processes
+"""
+import argparse
+import subprocess
+import sys
+import time
+
+from hotels import PROJ_ROOT
+
+targets = {
+    "hotels": "import hotels",
+    "hotels.load_data": "import hotels.load_data",
+    "Hotel PMS page": "import runpy; runpy.run_path('pages/1_📖_Hotel_PMS.py', run_name='benchmark')",
+    "Internal Dashboards page": "import runpy; runpy.run_path('pages/2_📊_Internal_Dashboards.py', run_name='benchmark')",
+}
+
+
+def measure(code: str) -> (float, float, str):
+    """
+    :return: cumulative import time of the top-level imports [ms], wall time of the process [ms], slowest import
+    """
+    start = time.perf_counter()
+    process = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code], cwd=PROJ_ROOT, capture_output=True, text=True, check=True
+    )
+    wall_time = (time.perf_counter() - start) * 1000
+
+    ## line format: "import time: <self [us]> | <cumulative [us]> | <indentation><module>"
+    top_level = []
+    for line in process.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, module = line[len("import time:") :].split("|")
+        if not module.startswith("  "):
+            top_level.append((int(cumulative) / 1000, module.strip()))
+
+    slowest = max(top_level)
+    return sum(t for t, _ in top_level), wall_time, f"{slowest[1]} ({slowest[0]:0.0f} ms)"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--repeat", type=int, default=3, help="the minimum over the repetitions is reported")
+    args = parser.parse_args()
+
+    print(f"{'target':<26} {'imports [ms]':>12} {'process [ms]':>12}  slowest top-level import")
+    for name, code in targets.items():
+        results = [measure(code) for _ in range(args.repeat)]
+        import_time = min(r[0] for r in results)
+        wall_time = min(r[1] for r in results)
+        print(f"{name:<26} {import_time:>12.0f} {wall_time:>12.0f}  {results[-1][2]}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""
+Scaling of the parallel execution of the cleaning and the action table by the number of worker processes
+"""
+import argparse
+import os
+import tempfile
+import time
+from pathlib import Path
+
+import pandas as pd
+
+from hotels.load_data import load_raw_hotel_data
+from pipelines.aggregate_data import write_partitioned_actions
+from pipelines.clean_data import DataCleaner
+
+
+def upscale(data_raw: pd.DataFrame, scale: int) -> pd.DataFrame:
+    """
+    Concatenate the raw data `scale` times. The copies are shifted by the number of days of lead_time, so that the
+    copies are not identical and the number of reservations per partition grows with the scale.
+    """
+    return pd.concat(
+        [data_raw.assign(lead_time=data_raw["lead_time"] + i) for i in range(scale)],
+        ignore_index=True,
+    )
+
+
+def time_it(func, *args, **kwargs) -> (float, object):
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    return time.perf_counter() - start, result
+
+
+def time_actions(df_booking: pd.DataFrame, workers: int) -> (float, pd.DataFrame):
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        output_dir = Path(tmp_dir) / "actions.parquet"
+        t, _ = time_it(write_partitioned_actions, df_booking, output_dir, workers=workers)
+        df_actions = pd.read_parquet(output_dir).sort_values(["reservation_id", "date"], ignore_index=True)
+    return t, df_actions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--input", help="raw data (parquet). The DVC-tracked hotels.parquet is used by default.")
+    parser.add_argument("--scale", type=int, default=8, help="upscale the raw data this many times")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    args = parser.parse_args()
+
+    data_raw = upscale(pd.read_parquet(args.input) if args.input else load_raw_hotel_data(), args.scale)
+    print(f"{len(data_raw)} rows, {os.cpu_count()} CPUs")
+
+    records = []
+    df_serial, df_actions_serial = None, None
+    for workers in args.workers:
+        t_clean, df_booking = time_it(DataCleaner.apply_all, data_raw, workers=workers)
+        t_actions, df_actions = time_actions(df_booking.query("is_canceled == 0 and n_stay_actual > 0"), workers)
+
+        ## the result must not depend on the number of workers
+        if df_serial is None:
+            df_serial, df_actions_serial = df_booking, df_actions
+        pd.testing.assert_frame_equal(df_serial, df_booking)
+        pd.testing.assert_frame_equal(df_actions_serial, df_actions)
+
+        records.append({"workers": workers, "clean_data [s]": t_clean, "action_data [s]": t_actions})
+
+    df_report = pd.DataFrame(records).set_index("workers")
+    df_report["speed-up"] = df_report.sum(axis=1).iloc[0] / df_report.sum(axis=1)
+    print(df_report.to_string(float_format=lambda v: f"{v:0.3f}"))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,290 @@
+"""
+Benchmark suite of the data pipeline and the dashboards
+
+For every scale, synthetic raw data is generated (see pipelines/synthetic.py) and all data sets are built in a
+temporary working tree, which is then read by the dashboards as the local data source. The benchmarks are
+
+- pipeline.clean_data.<step>: each step of DataCleaner
+- pipeline.action_data, pipeline.daily_facts, pipeline.pms_snapshot: the aggregations of the pipeline
+- dashboard.load.<data set>, dashboard.room_usage: loading the data sets and the occupancy cube
+- dashboard.<tab>.<compute function>: every compute_* function of pages/tab/*.py (without the Streamlit cache)
+- page.<page>: a headless render of each page with empty caches (AppTest)
+
+Each benchmark records the wall time (the best of --repeat runs) and the peak memory allocated during a run
+(tracemalloc). The results are written as JSON. Given a baseline (a former result), the benchmarks which are slower or
+allocate more memory than the baseline beyond the tolerances are listed and the exit status is 1.
+
+    poetry run python -m benchmarks.suite --scales 1 10 --save-baseline benchmarks/baseline.json
+    poetry run python -m benchmarks.suite --scales 1 10 --output result.json --baseline benchmarks/baseline.json
+"""
+import argparse
+import datetime as dt
+import inspect
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Callable, Optional
+
+import pandas as pd
+import pyarrow as pa
+import streamlit as st
+from streamlit.testing.v1.app_test import AppTest
+
+import hotels.load_data as load_data
+from hotels import PROJ_ROOT
+from hotels.dashboard import load_dataset
+from hotels.models import DataSource, DtypeBackend
+from hotels.occupancy import OccupancyCube
+from hotels.pms import aggregate_pms_snapshot
+from pipelines.aggregate_data import aggregate_daily_facts, write_partitioned_actions
+from pipelines.clean_data import DataCleaner, write_partitioned_bookings
+from pipelines.synthetic import fit_profile, generate_raw_data, raw_schema
+from pages.tab import cancallations, hotel_usage, marketing, sales
+
+tab_modules = [hotel_usage, sales, marketing, cancallations]
+page_files = ["1_📖_Hotel_PMS.py", "2_📊_Internal_Dashboards.py"]
+
+## files of the working tree which are not built by the pipeline
+_static_files = ["data/country_code.csv", "data/properties.csv"]
+
+
+def measure(func: Callable, repeat: int = 1, setup: Optional[Callable] = None) -> (dict, object):
+    """
+    :param func: function without arguments
+    :param repeat: number of runs. The best wall time is recorded.
+    :param setup: function called before every run (not measured)
+    :return: {"seconds": best wall time, "peak_mb": peak memory of a run}, result of the last run
+    """
+    timings = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+
+    if setup is not None:
+        setup()
+    tracemalloc.start()
+    try:
+        result = func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {"seconds": min(timings), "peak_mb": peak / 1024**2}, result
+
+
+def tab_compute_functions() -> dict[str, Callable]:
+    """:return: name -> compute_* function of the tab modules without the Streamlit cache"""
+    functions = {}
+    for module in tab_modules:
+        for name, func in vars(module).items():
+            func = getattr(func, "__wrapped__", func)
+            if name.startswith("compute_") and callable(func) and func.__module__ == module.__name__:
+                functions[f"{module.__name__.split('.')[-1]}.{name}"] = func
+    return functions
+
+
+def resolve_args(func: Callable, candidates: dict) -> dict:
+    """Arguments of func by parameter names. Parameters with a default value are left out."""
+    kwargs = {}
+    for param in inspect.signature(func).parameters.values():
+        if param.name in candidates:
+            kwargs[param.name] = candidates[param.name]
+        elif param.default is inspect.Parameter.empty:
+            raise ValueError(f"No benchmark argument for {func.__name__}({param.name}). Add it to run_dashboard().")
+    return kwargs
+
+
+class Suite:
+    def __init__(self, repeat: int):
+        self.repeat = repeat
+        self.records = []
+
+    def record(self, benchmark: str, scale: float, n_rows: int, func: Callable, setup: Optional[Callable] = None):
+        metrics, result = measure(func, repeat=self.repeat, setup=setup)
+        self.records.append({"benchmark": benchmark, "scale": scale, "n_rows": n_rows, **metrics})
+        print(f"{benchmark:<60} x{scale:<6g} {metrics['seconds']:>9.3f} s {metrics['peak_mb']:>9.1f} MiB", flush=True)
+        return result
+
+    def run_pipeline(self, root: Path, scale: float, data_raw: pd.DataFrame) -> None:
+        n_rows = len(data_raw)
+
+        df_booking = None
+        for i, step in enumerate(DataCleaner.steps):
+            steps_before = DataCleaner.steps[:i]
+            state = {}
+
+            def setup():
+                state["df"] = data_raw.copy()
+                DataCleaner._apply_steps(state["df"], steps_before)
+
+            self.record(
+                f"pipeline.clean_data.{step}", scale, n_rows, lambda: getattr(DataCleaner, step)(state["df"]), setup
+            )
+            df_booking = state["df"]
+
+        bookings_path = root / load_data.bookings_data_path.relative_to(PROJ_ROOT)
+        self.record(
+            "pipeline.clean_data.write", scale, n_rows, lambda: write_partitioned_bookings(df_booking, bookings_path)
+        )
+        df_booking = load_data.load_booking_data()
+
+        actions_path = root / load_data.actions_data_path.relative_to(PROJ_ROOT)
+        df_stay = df_booking.query("is_canceled == 0 and n_stay_actual > 0")
+        self.record(
+            "pipeline.action_data",
+            scale,
+            n_rows,
+            lambda: write_partitioned_actions(df_stay, actions_path),
+            setup=lambda: shutil.rmtree(actions_path, ignore_errors=True),
+        )
+
+        df_actions = load_data.load_action_data()
+        df_facts = self.record(
+            "pipeline.daily_facts", scale, n_rows, lambda: aggregate_daily_facts(df_booking, df_actions)
+        )
+        load_data.numpy_backed(df_facts).to_parquet(
+            root / load_data.daily_facts_data_path.relative_to(PROJ_ROOT), index=False
+        )
+
+        pms_tables = self.record("pipeline.pms_snapshot", scale, n_rows, lambda: aggregate_pms_snapshot(df_booking))
+        pms_paths = [load_data.pms_flows_data_path, load_data.pms_meals_data_path, load_data.pms_room_usage_data_path]
+        for df, path in zip(pms_tables, pms_paths):
+            df = load_data.numpy_backed(df).sort_values(by=["hotel", "date"], kind="stable")
+            df.to_parquet(root / path.relative_to(PROJ_ROOT))
+
+    def run_dashboard(self, scale: float, n_rows: int) -> None:
+        hotel = load_data.load_property_registry()[0].name
+        bookings = load_data.get_dataset_handle("bookings", hotel=hotel)
+        facts = load_data.get_dataset_handle("daily_facts", hotel=hotel)
+
+        for handle in [bookings, facts]:
+            self.record(f"dashboard.load.{handle.name}", scale, n_rows, handle.load)
+        df_booking = load_dataset(bookings)
+        self.record("dashboard.room_usage", scale, n_rows, lambda: OccupancyCube.from_bookings(df_booking).room_usage())
+
+        candidates = {"bookings": bookings, "facts": facts, "data": df_booking, "by": "arrival_date"}
+        for name, func in tab_compute_functions().items():
+            kwargs = resolve_args(func, candidates)
+            self.record(f"dashboard.{name}", scale, n_rows, lambda: func(**kwargs))
+
+        for page in page_files:
+            at = self.record(
+                f"page.{Path(page).stem}",
+                scale,
+                n_rows,
+                lambda: AppTest.from_file(str(PROJ_ROOT / "pages" / page), default_timeout=600).run(),
+                setup=clear_streamlit_caches,
+            )
+            if at.exception:
+                raise RuntimeError(f"{page} raised {len(at.exception)} exceptions: {at.exception[0].message}")
+
+    def run(self, profile: dict, scale: float, seed: int) -> None:
+        properties = [p.name for p in load_data.load_property_registry()]
+        ## the raw data as load_raw_hotel_data() reads it (with the configured dtype backend)
+        chunks = generate_raw_data(profile, scale, properties, seed=seed)
+        tables = [pa.Table.from_pandas(df, schema=raw_schema, preserve_index=False) for df in chunks]
+        data_raw = load_data.table_to_pandas(pa.concat_tables(tables))
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            root = Path(tmp_dir)
+            for path in _static_files:
+                (root / path).parent.mkdir(parents=True, exist_ok=True)
+                shutil.copy(PROJ_ROOT / path, root / path)
+            for path in [load_data.bookings_data_path, load_data.actions_data_path, load_data.daily_facts_data_path]:
+                (root / path.relative_to(PROJ_ROOT)).parent.mkdir(parents=True, exist_ok=True)
+
+            ## every data set is read from the temporary working tree
+            source, repo, rev = load_data.data_source, load_data.dvc_repo, load_data.dvc_rev
+            load_data.configure_data_source(DataSource.local, repo=str(root))
+            clear_streamlit_caches()
+            try:
+                self.run_pipeline(root, scale, data_raw)
+                self.run_dashboard(scale, len(data_raw))
+            finally:
+                clear_streamlit_caches()
+                load_data.configure_data_source(source, repo=repo, rev=rev)
+
+
+def clear_streamlit_caches():
+    st.cache_data.clear()
+    st.cache_resource.clear()
+
+
+def compare(df_result: pd.DataFrame, df_baseline: pd.DataFrame, time_tolerance: float, memory_tolerance: float):
+    """
+    :return: DataFrame of the regressions. A benchmark regresses if it is slower (or allocates more memory) than the
+             baseline by more than the tolerance (relative) and by more than 10 ms (1 MiB).
+    """
+    df = df_result.merge(df_baseline, on=["benchmark", "scale"], suffixes=("", "_baseline"))
+    is_slower = (df["seconds"] > df["seconds_baseline"] * (1 + time_tolerance)) & (
+        df["seconds"] - df["seconds_baseline"] > 0.01
+    )
+    is_larger = (df["peak_mb"] > df["peak_mb_baseline"] * (1 + memory_tolerance)) & (
+        df["peak_mb"] - df["peak_mb_baseline"] > 1
+    )
+    return df.loc[
+        is_slower | is_larger, ["benchmark", "scale", "seconds", "seconds_baseline", "peak_mb", "peak_mb_baseline"]
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--input", help="raw data (parquet) to fit the profile. hotels.parquet by default.")
+    parser.add_argument("--scales", type=float, nargs="+", default=[1, 4], help="sizes relative to the raw data")
+    parser.add_argument("--repeat", type=int, default=3, help="number of runs of each benchmark")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--dtype-backend",
+        choices=[b.value for b in DtypeBackend],
+        default=load_data.dtype_backend.value,
+        help="dtype backend of the loaded data sets (HOTELS_DTYPE_BACKEND by default)",
+    )
+    parser.add_argument("--output", help="write the results into this JSON file")
+    parser.add_argument("--baseline", help="JSON file of a former result to compare the results with")
+    parser.add_argument("--save-baseline", help="write the results into this JSON file as the new baseline")
+    parser.add_argument("--time-tolerance", type=float, default=0.5, help="allowed relative increase of time")
+    parser.add_argument("--memory-tolerance", type=float, default=0.2, help="allowed relative increase of memory")
+    args = parser.parse_args()
+    load_data.dtype_backend = DtypeBackend(args.dtype_backend)
+
+    data_raw = pd.read_parquet(args.input) if args.input else load_data.load_raw_hotel_data()
+    profile = fit_profile(data_raw)
+
+    suite = Suite(repeat=args.repeat)
+    for scale in args.scales:
+        suite.run(profile, scale, args.seed)
+
+    result = {
+        "created_at": dt.datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "repeat": args.repeat,
+        "dtype_backend": args.dtype_backend,
+        "results": suite.records,
+    }
+    for path in [args.output, args.save_baseline]:
+        if path:
+            Path(path).write_text(json.dumps(result, indent=2))
+            print(f"SAVED: {path}")
+
+    if args.baseline:
+        df_baseline = pd.DataFrame(json.loads(Path(args.baseline).read_text())["results"])
+        df_regressions = compare(pd.DataFrame(suite.records), df_baseline, args.time_tolerance, args.memory_tolerance)
+        if len(df_regressions):
+            print(f"REGRESSIONS against {args.baseline}:")
+            print(df_regressions.to_string(index=False, float_format=lambda v: f"{v:0.3f}"))
+            sys.exit(1)
+        print(f"No regressions against {args.baseline}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+"""
+The purpose of this module is to keep local copies of the DVC-tracked data files.
+
+A cached copy is addressed by the md5 which dvc.lock records for the file, so it stays valid as long as dvc.lock
+does not change and it can be shared by all processes on the machine. The least recently used copies are removed
+when the cache exceeds its size limit, except the copies which the dvc.lock of this process refers to and the copies
+which any process accessed recently (another process might be reading them).
+
+Environment variables:
+
+- HOTELS_CACHE: set "0" to disable the cache
+- HOTELS_CACHE_DIR: cache directory (default: ~/.cache/hotels)
+- HOTELS_CACHE_MAX_BYTES: size limit of the cache (default: 2 GiB)
+- HOTELS_CACHE_MMAP: set "1" to read cached parquet files with memory mapping
+- HOTELS_CACHE_MIN_AGE_SEC: copies accessed within this number of seconds are not evicted (default: 600)
+"""
+from pathlib import Path
+from typing import Optional
+import os
+import shutil
+import stat
+import tempfile
+import time
+
+import yaml
+
+cache_enabled = os.environ.get("HOTELS_CACHE", "1") != "0"
+cache_dir = Path(os.environ.get("HOTELS_CACHE_DIR", Path.home() / ".cache" / "hotels"))
+cache_max_bytes = int(os.environ.get("HOTELS_CACHE_MAX_BYTES", 2 * 1024**3))
+cache_memory_map = os.environ.get("HOTELS_CACHE_MMAP", "0") == "1"
+cache_min_age_sec = float(os.environ.get("HOTELS_CACHE_MIN_AGE_SEC", "600"))
+
+
+def parse_dvc_lock(text: str) -> dict[str, str]:
+    """
+    :return: mapping of the paths of the stage outputs to their md5 (e.g. "data/raw/hotels.parquet" -> "a0c8...")
+    """
+    lock = yaml.safe_load(text) or {}
+    return {
+        out["path"]: out["md5"]
+        for stage in lock.get("stages", {}).values()
+        for out in stage.get("outs", [])
+        if "md5" in out
+    }
+
+
+def _entry_stat(entry: Path) -> Optional[tuple[float, int]]:
+    """
+    :return: modification time and size of a cache entry. None if another process has evicted it in the meantime.
+    """
+    try:
+        entry_stat = entry.stat()
+        if stat.S_ISREG(entry_stat.st_mode):
+            return entry_stat.st_mtime, entry_stat.st_size
+        return entry_stat.st_mtime, sum(p.stat().st_size for p in entry.rglob("*") if p.is_file())
+    except FileNotFoundError:
+        return None
+
+
+class LocalDataCache:
+    """
+    Content-addressed copies of DVC outputs: <cache_dir>/<md5>/<file name>
+    The modification time of <cache_dir>/<md5> is the time of the last access.
+    """
+
+    def __init__(
+        self,
+        fs,
+        lock_md5s: dict[str, str],
+        directory: Path = cache_dir,
+        max_bytes: int = cache_max_bytes,
+        min_age_sec: float = cache_min_age_sec,
+    ):
+        """
+        :param fs: filesystem of the DVC repository (dvc.api.DVCFileSystem)
+        :param lock_md5s: md5s of the pipeline outputs in dvc.lock of the repository (see parse_dvc_lock())
+        :param directory: cache directory
+        :param max_bytes: size limit of the cache. Older entries are evicted if it is exceeded.
+        :param min_age_sec: entries accessed within this number of seconds are not evicted
+        """
+        self.fs = fs
+        self.lock_md5s = lock_md5s
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self.min_age_sec = min_age_sec
+
+    def fetch(self, repo_path: str) -> Optional[Path]:
+        """
+        Return the local copy of the file (or directory) in the DVC repository. It is downloaded if it is not cached.
+
+        :param repo_path: path in the repository such as "/data/cleaned/bookings.parquet"
+        :return: local path. None if the path is not an output of the pipeline.
+        """
+        md5 = self.lock_md5s.get(repo_path.lstrip("/"))
+        if md5 is None:
+            return None
+
+        entry = self.directory / md5.replace(".dir", "")
+        local_path = entry / Path(repo_path).name
+
+        if not entry.exists():
+            self.directory.mkdir(parents=True, exist_ok=True)
+            tmp_dir = Path(tempfile.mkdtemp(dir=self.directory, prefix=".tmp-"))
+            try:
+                self.fs.get(repo_path, str(tmp_dir / local_path.name), recursive=md5.endswith(".dir"))
+                tmp_dir.rename(entry)  ## atomic. Another process might have stored the same entry in the meantime.
+            except OSError:
+                if not entry.exists():
+                    raise
+            finally:
+                shutil.rmtree(tmp_dir, ignore_errors=True)
+            self.evict()
+
+        try:
+            os.utime(entry)
+        except FileNotFoundError:
+            return self.fetch(repo_path)  ## evicted by another process in the meantime
+        return local_path
+
+    def evict(self):
+        """
+        Remove the least recently used entries until the cache fits into max_bytes. An entry is renamed before it is
+        removed, so that no process finds a partially removed entry. Entries which another process evicts in the
+        meantime are skipped.
+        """
+        in_use = {md5.replace(".dir", "") for md5 in self.lock_md5s.values()}
+        stats = {}
+        for entry in self.directory.iterdir():
+            entry_stat = None if entry.name.startswith(".") else _entry_stat(entry)
+            if entry_stat is not None:
+                stats[entry] = entry_stat
+        total_size = sum(size for _, size in stats.values())
+        min_mtime = time.time() - self.min_age_sec
+
+        for entry, (mtime, size) in sorted(stats.items(), key=lambda item: item[1][0]):
+            if total_size <= self.max_bytes:
+                break
+            if entry.name in in_use or mtime > min_mtime:
+                continue
+            trash = self.directory / f".trash-{entry.name}-{os.getpid()}"
+            try:
+                entry.rename(trash)
+            except OSError:
+                continue  ## removed by another process
+            shutil.rmtree(trash, ignore_errors=True)
+            total_size -= size
@@ -1,14 +1,106 @@
+from typing import Optional
+import os
+
 import altair as alt
 import pandas as pd
 import streamlit as st
 
+from hotels.load_data import DatasetHandle, MissingOutputsError, require_outputs
 from hotels.models import TUTransform
+from hotels.occupancy import OccupancyCube
+
+## Set HOTELS_SERVER_SIDE_AGGREGATION=1 to aggregate daily data by the time unit in pandas before building charts.
+## Otherwise every daily row is sent to the browser and Vega-Lite aggregates it.
+server_side_aggregation = os.environ.get("HOTELS_SERVER_SIDE_AGGREGATION", "0") == "1"
 
 
 def set_page_config():
     st.set_page_config(page_icon=":hotel:", layout="wide")
 
 
+def stop_if_missing(repo_paths: list[str]):
+    """
+    Show which data sets are missing (see require_outputs()) and stop the page instead of raising an error.
+    Other errors of the data source, e.g. an unknown DVC revision, are raised.
+    """
+    try:
+        require_outputs(repo_paths)
+    except MissingOutputsError as e:
+        st.error(str(e))
+        st.stop()
+
+
+@st.cache_resource(max_entries=16)
+def load_dataset(handle: DatasetHandle) -> pd.DataFrame:
+    """
+    The loaded data set is shared by all sessions and reruns. Do not modify it in place.
+    """
+    return handle.load()
+
+
+@st.cache_resource(max_entries=16)
+def load_room_usage(bookings: DatasetHandle) -> (pd.DataFrame, pd.DataFrame):
+    """
+    :param bookings: handle of the bookings
+    :return: DataFrame[hotel, room_type, date, n_occupied_rooms], DataFrame[hotel, room_type, n_rooms]
+    """
+    cube = OccupancyCube.from_bookings(load_dataset(bookings))
+    return cube.room_usage(), cube.room_count()
+
+
+def truncate_date(s_date: pd.Series, tu_transform: TUTransform) -> pd.Series:
+    """
+    Start of the period of the Vega-Lite time unit which the date belongs to. (Weeks start on Sunday.)
+    """
+    s_date = s_date.dt.normalize()
+    if tu_transform == TUTransform.yearweek:
+        return s_date - pd.to_timedelta((s_date.dt.dayofweek + 1) % 7, unit="D")
+    elif tu_transform == TUTransform.yearmonth:
+        return s_date - pd.to_timedelta(s_date.dt.day - 1, unit="D")
+    elif tu_transform == TUTransform.yearmonthdate:
+        return s_date
+    else:
+        raise ValueError(f"{tu_transform} does not belong to TUTransform")
+
+
+def prepare_time_unit_data(
+    data: pd.DataFrame,
+    tu_transform: TUTransform,
+    fields: list[str],
+    by: tuple[str, ...] = (),
+    agg: str = "mean",
+    date_field: str = "date",
+    server_side: Optional[bool] = None,
+) -> (pd.DataFrame, str, str):
+    """
+    Data for a chart which aggregates daily values by the time unit.
+
+    In the server-side mode the values are aggregated here, one row per period (and group). The date field becomes the
+    start of the period, so that the time unit transform and the aggregation of the chart return the same values.
+    The first and the last date of each period are kept in min_date and max_date.
+
+    :param fields: fields to aggregate
+    :param by: fields to group by in addition to the period
+    :param agg: aggregation of the fields (the same aggregation as the chart)
+    :param server_side: aggregate in pandas. By default server_side_aggregation.
+    :return: data, field of the first date, field of the last date
+    """
+    if server_side is None:
+        server_side = server_side_aggregation
+    if not server_side or tu_transform == TUTransform.yearmonthdate:
+        ## daily data is already aggregated by day
+        return data, date_field, date_field
+
+    df = (
+        data.assign(min_date=data[date_field], max_date=data[date_field])
+        .assign(**{date_field: truncate_date(data[date_field], tu_transform)})
+        .groupby([date_field, *by], observed=True)
+        .agg(min_date=("min_date", "min"), max_date=("max_date", "max"), **{f: (f, agg) for f in fields})
+        .reset_index()
+    )
+    return df, "min_date", "max_date"
+
+
 def draw_quartiles(x: pd.Series, y: pd.Series, text_format: str = "0.1f") -> alt.Chart:
     s_q = y.quantile(q=[0.25, 0.50, 0.75])
     chart_base = alt.Chart(s_q.to_frame().assign(x=x.min()))
@@ -20,7 +112,7 @@ def draw_quartiles(x: pd.Series, y: pd.Series, text_format: str = "0.1f") -> alt
 
 
 def draw_daily_kpi_with_quoters(
-    data: pd.DataFrame, tu_transform: TUTransform, kpi_is_proportion: bool = False
+    data: pd.DataFrame, tu_transform: TUTransform, kpi_is_proportion: bool = False, server_side: Optional[bool] = None
 ) -> alt.Chart:
     kpi = [c for c in data.columns.to_list() if c != "date"][0]
     q1, q2, q3 = data[kpi].quantile(q=[0.25, 0.50, 0.75])
@@ -47,14 +139,15 @@ def draw_daily_kpi_with_quoters(
     else:
         format = "0.2f"
 
-    chart_base: alt.Chart = alt.Chart(data).encode(
+    data_chart, min_date, max_date = prepare_time_unit_data(data, tu_transform, [kpi], server_side=server_side)
+    chart_base: alt.Chart = alt.Chart(data_chart).encode(
         x=alt.X(f"{tu_transform}(date)").title("date"),
         y=y_axis,
         color=color,
         tooltip=[
             alt.Tooltip(f"{tu_transform}(date)", title="date"),
-            alt.Tooltip(f"min(date)", title="Start date"),
-            alt.Tooltip(f"max(date)", title="End date"),
+            alt.Tooltip(f"min({min_date})", title="Start date"),
+            alt.Tooltip(f"max({max_date})", title="End date"),
             alt.Tooltip(f"mean({kpi})", title="Daily Average", format=format),
         ],
     )
@@ -70,6 +163,7 @@ def draw_kpi_by_cat(
     cat_field: str,
     kpi_field: str,
     *additional_kpis,
+    server_side: Optional[bool] = None,
 ) -> alt.Chart:
     """
 
@@ -78,17 +172,21 @@ def draw_kpi_by_cat(
     :param cat_field: categorical variable
     :param kpi_field: numerical variable
     :param additional_kpis: values you want to show in the tooltip
+    :param server_side: see prepare_time_unit_data()
     :return:
     """
     cats = sorted(data[cat_field].drop_duplicates())
+    data, min_date, max_date = prepare_time_unit_data(
+        data, tu_transform, [kpi_field, *additional_kpis], by=(cat_field,), server_side=server_side
+    )
     cats_selector = alt.selection_point(name=cat_field + "/" + kpi_field, fields=[cat_field], bind="legend")
     nearest = alt.selection_point(on="mouseover", nearest=True, empty=False, fields=["x", "y"])
 
     tooltip = [
         alt.Tooltip(cat_field),
         alt.Tooltip(f"{tu_transform}(date)"),
-        alt.Tooltip(f"min(date)", title="Start date"),
-        alt.Tooltip(f"max(date)", title="End date"),
+        alt.Tooltip(f"min({min_date})", title="Start date"),
+        alt.Tooltip(f"max({max_date})", title="End date"),
         alt.Tooltip(f"mean({kpi_field})", format="0.2f", title=f"Avg {kpi_field} by day"),
     ]
 
@@ -1,36 +1,412 @@
 """
 The purpose of this module is to provide functions to load various data sets
+
+The data sets are read from the DVC repository by default. Environment variables:
+
+- HOTELS_DATA_SOURCE: "dvc" (default) or "local" (the files in the data directory of a working tree)
+- HOTELS_DVC_REPO: URL or path of the DVC repository, or the path of the working tree for "local"
+  (default: this repository)
+- HOTELS_DVC_REV: git revision of the DVC repository (default: main)
+- HOTELS_DTYPE_BACKEND: "numpy" (default) or "pyarrow" (string columns stay in Arrow buffers, see arrow_types_mapper())
 """
+from dataclasses import dataclass
+from functools import lru_cache
+from pathlib import Path
+from typing import TYPE_CHECKING, Optional
+import datetime as dt
+import os
 
 import pandas as pd
-import dvc.api as dvc
+import yaml
+
+from hotels import PROJ_ROOT, DATA_DIR
+from hotels.cache import LocalDataCache, cache_enabled, cache_memory_map, parse_dvc_lock
+from hotels.models import DataSource, DtypeBackend, Property, RawDataSource
 
-from hotels import DATA_DIR
+if TYPE_CHECKING:
+    import pyarrow as pa
 
-hotel_raw_data_path = DATA_DIR / "raw" / "hotels.parquet"
+## raw data by source (raw_data.source in params.yaml)
+hotel_raw_data_path = DATA_DIR / "raw" / "tidytuesday" / "hotels.parquet"
+synthetic_raw_data_path = DATA_DIR / "raw" / "synthetic" / "hotels.parquet"
+synthetic_profile_path = DATA_DIR / "raw" / "synthetic" / "synthetic_profile.json"
 bookings_data_path = DATA_DIR / "cleaned" / "bookings.parquet"
 actions_data_path = DATA_DIR / "aggregated" / "actions.parquet"
+daily_facts_data_path = DATA_DIR / "aggregated" / "daily_facts.parquet"
+pms_flows_data_path = DATA_DIR / "aggregated" / "pms_flows.parquet"
+pms_meals_data_path = DATA_DIR / "aggregated" / "pms_meals.parquet"
+pms_room_usage_data_path = DATA_DIR / "aggregated" / "pms_room_usage.parquet"
+
+## Rows are sorted by hotel and date before writing, so that readers can skip row groups by their statistics.
+parquet_row_group_size = 10_000
+
+## compact schema of bookings.parquet (see DataCleaner.compact_dtypes)
+booking_category_cols = [
+    "hotel",
+    "meal",
+    "country",
+    "market_segment",
+    "distribution_channel",
+    "reserved_room_type",
+    "assigned_room_type",
+    "deposit_type",
+    "customer_type",
+    "reservation_status",
+]
+booking_int_dtypes = {
+    "is_canceled": "int8",
+    "lead_time": "int16",
+    "stays_in_weekend_nights": "int8",
+    "stays_in_week_nights": "int8",
+    "adults": "int8",
+    "children": "int8",
+    "babies": "int8",
+    "is_repeated_guest": "int8",
+    "previous_cancellations": "int8",
+    "previous_bookings_not_canceled": "int16",
+    "booking_changes": "int8",
+    "days_in_waiting_list": "int16",
+    "required_car_parking_spaces": "int8",
+    "total_of_special_requests": "int8",
+    "n_lodgers": "int8",
+    "n_nights": "int16",
+}
+booking_meal_cols = ["breakfast", "lunch", "dinner"]
+booking_date_cols = [
+    "reservation_status_date",
+    "arrival_date",
+    "departure_date",
+    "reservation_date",
+    "actual_departure_date",
+]
+
+data_source = DataSource(os.environ.get("HOTELS_DATA_SOURCE", DataSource.dvc.value))
+dvc_repo = os.environ.get("HOTELS_DVC_REPO", str(PROJ_ROOT))
+dvc_rev = os.environ.get("HOTELS_DVC_REV", "main")
+dtype_backend = DtypeBackend(os.environ.get("HOTELS_DTYPE_BACKEND", DtypeBackend.numpy.value))
+
+
+def configure_data_source(source: DataSource, repo: Optional[str] = None, rev: str = "main"):
+    """
+    Change the location of the data sets. The filesystem is created again on the next access.
+
+    :param source: DVC repository or the local working tree
+    :param repo: URL or path of the DVC repository (or the path of the working tree for DataSource.local).
+                 This repository by default.
+    :param rev: git revision of the DVC repository (Ignored for DataSource.local)
+    """
+    global data_source, dvc_repo, dvc_rev
+    data_source, dvc_repo, dvc_rev = DataSource(source), repo or str(PROJ_ROOT), rev
+    get_filesystem.cache_clear()
+    get_data_cache.cache_clear()
+    get_lock_md5s.cache_clear()
+    load_property_registry.cache_clear()
+
+
+@lru_cache(maxsize=1)
+def load_pipeline_params() -> dict:
+    """Parameters of the data pipeline in params.yaml of the working tree (see dvc.yaml)"""
+    return yaml.safe_load((PROJ_ROOT / "params.yaml").read_text())
+
+
+@lru_cache(maxsize=1)
+def get_filesystem():
+    """
+    The filesystem of the data sets, created on the first call. Paths start with "/" at the root of the repository.
+    DVC is imported here because constructing its filesystem is expensive and not every process needs it.
+    """
+    if data_source == DataSource.local:
+        from fsspec.implementations.dirfs import DirFileSystem
+        from fsspec.implementations.local import LocalFileSystem
+
+        return DirFileSystem(dvc_repo, LocalFileSystem())
+
+    import dvc.api as dvc
+
+    return dvc.DVCFileSystem(dvc_repo, rev=dvc_rev)
+
+
+@lru_cache(maxsize=1)
+def get_data_cache() -> Optional[LocalDataCache]:
+    """The local cache is used only for the DVC repository"""
+    if data_source == DataSource.local or not cache_enabled:
+        return None
+    return LocalDataCache(get_filesystem(), get_lock_md5s())
+
+
+@lru_cache(maxsize=1)
+def get_lock_md5s() -> dict[str, str]:
+    """
+    md5s of the pipeline outputs in the dvc.lock files of the DVC repository (see parse_dvc_lock()). An error of DVC
+    or git (e.g. an unknown revision or an unreachable repository) is raised as it is, so that it is not taken for
+    missing outputs.
+    """
+    fs = get_filesystem()
+    with fs.open("/dvc.lock") as fo:
+        md5s = parse_dvc_lock(fo.read().decode())
+
+    ## The stages of the synthetic raw data have their own dvc.lock, which exists only after they have been run.
+    try:
+        with fs.open("/data/raw/synthetic/dvc.lock") as fo:
+            md5s.update(parse_dvc_lock(fo.read().decode()))
+    except FileNotFoundError:
+        pass
+    return md5s
+
+
+def dataset_version(repo_path: str) -> str:
+    """
+    Version of the content of a data set. It changes whenever the content changes.
+
+    - DVC repository: md5 of the file (or directory) in dvc.lock
+    - local working tree: the latest modification time and the total size of the files
+    """
+    if data_source == DataSource.local:
+        path = Path(dvc_repo) / repo_path.lstrip("/")
+        files = [path] if path.is_file() else [p for p in path.rglob("*") if p.is_file()]
+        stats = [f.stat() for f in files]
+        return f"{max((st.st_mtime_ns for st in stats), default=0)}-{sum(st.st_size for st in stats)}"
+
+    return get_lock_md5s().get(repo_path.lstrip("/"), f"{dvc_repo}@{dvc_rev}")
+
+
+def missing_outputs(repo_paths: list[str]) -> list[str]:
+    """
+    :param repo_paths: paths in the repository such as "/data/aggregated/daily_facts.parquet"
+    :return: the paths which do not exist at the data source (for the DVC repository: not in dvc.lock)
+    """
+    if data_source == DataSource.local:
+        return [p for p in repo_paths if not (Path(dvc_repo) / p.lstrip("/")).exists()]
+    return [p for p in repo_paths if p.lstrip("/") not in get_lock_md5s()]
+
+
+class MissingOutputsError(FileNotFoundError):
+    """Outputs of the data pipeline do not exist at the data source (see require_outputs())"""
+
+
+def require_outputs(repo_paths: list[str]):
+    """
+    Raise a MissingOutputsError if a pipeline output does not exist at the data source. This happens if dvc.lock of
+    the DVC revision was committed before the stage of the output was added to dvc.yaml.
+
+    :param repo_paths: paths in the repository such as "/data/aggregated/daily_facts.parquet"
+    """
+    missing = missing_outputs(repo_paths)
+    if data_source == DataSource.local:
+        location, hint = dvc_repo, "Run `poetry run dvc repro` to build them."
+    else:
+        location = f"{dvc_repo}@{dvc_rev}"
+        hint = (
+            "Run `poetry run dvc repro` and `poetry run dvc push`, and commit dvc.lock to the revision. "
+            "Or set HOTELS_DATA_SOURCE=local to read the working tree."
+        )
+    if missing:
+        raise MissingOutputsError(f"Missing outputs of the data pipeline at {location}: {missing}. {hint}")
+
+
+def arrow_types_mapper(pa_type: "pa.DataType") -> Optional[pd.ArrowDtype]:
+    """
+    Types mapper of pa.Table.to_pandas() for DtypeBackend.pyarrow. String columns (e.g. reservation_id) become
+    pd.ArrowDtype columns, which keep the Arrow buffers instead of creating a Python object for every value, so that
+    merges and str methods run in Arrow compute. Dictionary-encoded columns stay pandas categoricals (their codes are
+    already compact) and numbers and timestamps stay NumPy arrays, which the computations index directly.
+    """
+    import pyarrow as pa
+
+    if pa.types.is_string(pa_type) or pa.types.is_large_string(pa_type):
+        return pd.ArrowDtype(pa_type)
+    return None
 
-fs = dvc.DVCFileSystem(uel="https://github.com/stdiff/hotels", rev="main")
 
+def table_to_pandas(table: "pa.Table") -> pd.DataFrame:
+    """Convert an Arrow table to a DataFrame of the configured dtype backend"""
+    return table.to_pandas(types_mapper=arrow_types_mapper if dtype_backend == DtypeBackend.pyarrow else None)
 
-def load_raw_hotel_data() -> pd.DataFrame:
-    with fs.open("/data/raw/hotels.parquet") as fo:
-        return pd.read_parquet(fo)
+
+def numpy_backed(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    The inverse of arrow_types_mapper() for writing a data set: Arrow-backed columns become NumPy (object) columns,
+    because pandas records the dtypes in the parquet file. So the pipeline writes the same files with either dtype
+    backend. A NumPy-backed DataFrame is returned as it is.
+    """
+    dtypes = {}
+    for col, dtype in df.dtypes.items():
+        if isinstance(dtype, pd.ArrowDtype):
+            import pyarrow as pa
+
+            is_string = pa.types.is_string(dtype.pyarrow_dtype) or pa.types.is_large_string(dtype.pyarrow_dtype)
+            dtypes[col] = object if is_string else dtype.numpy_dtype
+        elif isinstance(dtype, pd.CategoricalDtype) and isinstance(dtype.categories.dtype, pd.ArrowDtype):
+            dtypes[col] = pd.CategoricalDtype(dtype.categories.astype(object), ordered=dtype.ordered)
+    return df.astype(dtypes) if dtypes else df
+
+
+def _read_parquet(repo_path: str, **kwargs) -> pd.DataFrame:
+    """Read a parquet file (or dataset) in the DVC repository through the local cache"""
+    require_outputs([repo_path])
+    data_cache = get_data_cache()
+    local_path = data_cache.fetch(repo_path) if data_cache is not None else None
+    if local_path is None:
+        path, kwargs = repo_path, {"filesystem": get_filesystem(), **kwargs}
+    else:
+        path, kwargs = local_path, {"memory_map": cache_memory_map, **kwargs}
+
+    if dtype_backend == DtypeBackend.numpy:
+        return pd.read_parquet(path, **kwargs)
+
+    ## pyarrow is imported here like dvc in get_filesystem(), so that importing this module stays cheap
+    import pyarrow.parquet as pq
+
+    return table_to_pandas(pq.read_table(path, **kwargs))
+
+
+def load_raw_hotel_data(source: Optional[RawDataSource] = None) -> pd.DataFrame:
+    """:param source: source of the raw data. raw_data.source in params.yaml by default."""
+    if source is None:
+        source = RawDataSource(load_pipeline_params()["raw_data"]["source"])
+    return _read_parquet(f"/data/raw/{source.value}/hotels.parquet")
 
 
 def load_country_code_mapping() -> dict[str, str]:
     """Mapping table between country code (such as JPN) and country name (Japan)"""
-    with fs.open("/data/country_code.csv") as fo:
+    with get_filesystem().open("/data/country_code.csv") as fo:
         df = pd.read_csv(fo)
     return df.set_index("code")["country"].to_dict()
 
 
-def load_booking_data() -> pd.DataFrame:
-    with fs.open("/data/cleaned/bookings.parquet") as fo:
-        return pd.read_parquet(fo)
+@lru_cache(maxsize=1)
+def load_property_registry() -> tuple[Property, ...]:
+    """
+    Properties of the portfolio in data/properties.csv. A new property is added by adding a row to the file.
+    The names are the values of the hotel column, which partitions the data sets.
+    """
+    with get_filesystem().open("/data/properties.csv") as fo:
+        df = pd.read_csv(fo, dtype=str)
+
+    duplicated_codes = df.loc[df["code"].duplicated(), "code"].to_list()
+    if duplicated_codes:
+        raise ValueError(f"Property codes must be unique: {duplicated_codes}")
+    return tuple(Property(name=row.hotel, code=row.code) for row in df.itertuples())
+
+
+def make_filters(
+    hotel: Optional[str] = None,
+    date_field: str = "date",
+    start_date: Optional[dt.date] = None,
+    end_date: Optional[dt.date] = None,
+) -> Optional[list[tuple]]:
+    """
+    Build a predicate for the filters parameter of load_booking_data() and load_action_data().
+
+    :param hotel: name of the hotel such as "City Hotel"
+    :param date_field: date column the date range is applied to (e.g. arrival_date for bookings)
+    :param start_date: first date (inclusive)
+    :param end_date: last date (inclusive)
+    :return: filters in the disjunctive normal form of pyarrow. None if there is no condition.
+    """
+    filters = []
+    if hotel is not None:
+        filters.append(("hotel", "==", str(hotel)))
+    if start_date is not None:
+        filters.append((date_field, ">=", pd.Timestamp(start_date)))
+    if end_date is not None:
+        filters.append((date_field, "<=", pd.Timestamp(end_date)))
+    return filters or None
+
+
+def load_booking_data(columns: Optional[list[str]] = None, filters: Optional[list[tuple]] = None) -> pd.DataFrame:
+    """
+    The bookings are a parquet dataset partitioned by hotel. A filter on hotel reads only the partition of the hotel.
+
+    :param columns: columns to read. All columns by default.
+    :param filters: row filters (see make_filters()). Row groups which do not match are not read.
+    """
+    df = _read_parquet("/data/cleaned/bookings.parquet", columns=columns, filters=filters)
+
+    ## Parquet has no timestamps in seconds. They are stored in milliseconds.
+    return df.astype({c: "datetime64[s]" for c in booking_date_cols if c in df.columns})
+
+
+def load_action_data(columns: Optional[list[str]] = None, filters: Optional[list[tuple]] = None) -> pd.DataFrame:
+    """
+    The action table is a parquet dataset partitioned by hotel and arrival month.
+    A filter on hotel reads only the partitions of the hotel.
+
+    :param columns: columns to read. By default: reservation_id, date, action
+    :param filters: row filters (see make_filters())
+    """
+    if columns is None:
+        columns = ["reservation_id", "date", "action"]
+    return _read_parquet("/data/aggregated/actions.parquet", columns=columns, filters=filters)
+
+
+def load_daily_facts(columns: Optional[list[str]] = None, filters: Optional[list[tuple]] = None) -> pd.DataFrame:
+    """
+    Daily measures of the staying guests.
+
+    PK = (hotel, date, room_type, country, market_segment, is_family)
+    :return: DataFrame[hotel, date, room_type, country, market_segment, is_family,
+                       n_occupied_rooms, n_guests, required_car_parking_spaces, sales]
+    """
+    return _read_parquet("/data/aggregated/daily_facts.parquet", columns=columns, filters=filters)
+
+
+pms_snapshot_repo_paths = [
+    "/data/aggregated/pms_flows.parquet",
+    "/data/aggregated/pms_meals.parquet",
+    "/data/aggregated/pms_room_usage.parquet",
+]
+
+
+def load_pms_snapshot(filters: Optional[list[tuple]] = None) -> (pd.DataFrame, pd.DataFrame, pd.DataFrame):
+    """
+    Morning and evening snapshots of the Hotel PMS page by hotel and date (see aggregate_pms_snapshot()).
+
+    :param filters: row filters (see make_filters())
+    :return: DataFrame[hotel, date, period, flow_type, n_rooms, n_adults, n_children, n_babies],
+             DataFrame[hotel, date, n_breakfast, n_lunch, n_dinner],
+             DataFrame[hotel, date, period, flow_type, reserved_room_type, assigned_room_type, n_rooms]
+    """
+    return tuple(_read_parquet(repo_path, filters=filters) for repo_path in pms_snapshot_repo_paths)
+
+
+@dataclass(frozen=True)
+class DatasetHandle:
+    """
+    Lightweight reference to a data set: which data set, its content version and the rows/columns to read.
+
+    Computations on a data set can be cached by the handle instead of the loaded DataFrame. Hashing a handle costs
+    microseconds regardless of the size of the data, and the key changes when the content changes.
+    """
+
+    name: str  ## key of datasets, e.g. "bookings"
+    version: str
+    hotel: Optional[str] = None
+    columns: Optional[tuple[str, ...]] = None
+
+    def load(self) -> pd.DataFrame:
+        columns = list(self.columns) if self.columns is not None else None
+        return datasets[self.name][1](columns=columns, filters=make_filters(hotel=self.hotel))
+
+
+## name -> (path in the repository, loader)
+datasets = {
+    "bookings": ("/data/cleaned/bookings.parquet", load_booking_data),
+    "actions": ("/data/aggregated/actions.parquet", load_action_data),
+    "daily_facts": ("/data/aggregated/daily_facts.parquet", load_daily_facts),
+}
 
 
-def load_action_data() -> pd.DataFrame:
-    with fs.open("/data/aggregated/actions.parquet") as fo:
-        return pd.read_parquet(fo)
+def get_dataset_handle(name: str, hotel: Optional[str] = None, columns: Optional[list[str]] = None) -> DatasetHandle:
+    """
+    :param name: bookings, actions or daily_facts
+    :param hotel: name of the hotel such as "City Hotel". Only the rows of the hotel are read. All hotels by default.
+    :param columns: columns to read. The default columns of the loader by default.
+    """
+    repo_path, _ = datasets[name]
+    return DatasetHandle(
+        name=name,
+        version=dataset_version(repo_path),
+        hotel=hotel,
+        columns=tuple(columns) if columns is not None else None,
+    )
@@ -1,9 +1,28 @@
+from dataclasses import dataclass
 from enum import Enum
 
 
-class Hotel(str, Enum):
-    city_hotel = "City Hotel"
-    resort_hotel = "Resort Hotel"
+@dataclass(frozen=True)
+class Property:
+    """A hotel of the portfolio (see load_property_registry())"""
+
+    name: str  ## value of the hotel column, e.g. "City Hotel"
+    code: str  ## prefix of reservation_id, e.g. "C"
+
+
+class DataSource(str, Enum):
+    dvc = "dvc"
+    local = "local"
+
+
+class DtypeBackend(str, Enum):
+    numpy = "numpy"
+    pyarrow = "pyarrow"
+
+
+class RawDataSource(str, Enum):
+    tidytuesday = "tidytuesday"
+    synthetic = "synthetic"
 
 
 class ReservationStatus(str, Enum):
@@ -0,0 +1,105 @@
+"""
+The purpose of this module is to count occupied rooms without exploding reservations into actions
+"""
+import datetime as dt
+
+import numpy as np
+import pandas as pd
+
+from hotels import data_start_date, data_end_date_incl
+
+
+class OccupancyCube:
+    """
+    Dense array of the number of occupied rooms with axes (hotel, room_type, date).
+
+    A room is occupied from the arrival date to the day before the actual departure date. For each reservation we add
+    +1 at the arrival date and -1 at the departure date to a difference array, and the cumulative sum along the date
+    axis gives the number of occupied rooms.
+    """
+
+    def __init__(
+        self,
+        hotels: pd.Index,
+        room_types: pd.Index,
+        dates: pd.DatetimeIndex,
+        counts: np.ndarray,
+        has_room_type: np.ndarray,
+    ):
+        """
+        :param counts: number of occupied rooms. shape = (hotels, room_types, dates)
+        :param has_room_type: boolean array of shape (hotels, room_types). True if the room type is used in the hotel.
+        """
+        self.hotels = hotels
+        self.room_types = room_types
+        self.dates = dates
+        self.counts = counts
+        self.has_room_type = has_room_type
+
+    @classmethod
+    def from_bookings(
+        cls, df_booking: pd.DataFrame, start_date: dt.date = data_start_date, end_date: dt.date = data_end_date_incl
+    ) -> "OccupancyCube":
+        """
+        :param df_booking: DataFrame[hotel, assigned_room_type, is_canceled, arrival_date, actual_departure_date,
+                                     n_stay_actual]
+        :param start_date: first date of the date axis
+        :param end_date: last date of the date axis (inclusive)
+        """
+        df_stay = df_booking.query("is_canceled == 0 and n_stay_actual > 0")
+        dates = pd.date_range(start_date, end_date, name="date")
+
+        hotel_codes, hotels = pd.factorize(df_stay["hotel"], sort=True)
+        room_type_codes, room_types = pd.factorize(df_stay["assigned_room_type"], sort=True)
+        shape = (len(hotels), len(room_types), len(dates) + 1)
+
+        ## positions on the date axis. Stays outside of the axis are clipped.
+        origin = dates[0].to_datetime64().astype("datetime64[D]")
+        arrival = (df_stay["arrival_date"].to_numpy().astype("datetime64[D]") - origin).astype(np.int64)
+        departure = (df_stay["actual_departure_date"].to_numpy().astype("datetime64[D]") - origin).astype(np.int64)
+        arrival = np.clip(arrival, 0, len(dates))
+        departure = np.clip(departure, 0, len(dates))
+
+        cell = (hotel_codes * shape[1] + room_type_codes) * shape[2]
+        size = np.prod(shape)
+        diff = np.bincount(cell + arrival, minlength=size) - np.bincount(cell + departure, minlength=size)
+        counts = np.cumsum(diff.reshape(shape), axis=2)[:, :, :-1]
+
+        has_room_type = np.zeros(shape[:2], dtype=bool)
+        has_room_type[hotel_codes, room_type_codes] = True
+
+        return cls(pd.Index(hotels), pd.Index(room_types), dates, counts, has_room_type)
+
+    def room_usage(self) -> pd.DataFrame:
+        """
+        PK = (hotel, room_type, date). Only the room types which the hotel has are contained.
+
+        :return: DataFrame[hotel, room_type, date, n_occupied_rooms]
+        """
+        hotel_idx, room_type_idx = np.nonzero(self.has_room_type)
+        n_dates = len(self.dates)
+
+        return pd.DataFrame(
+            {
+                "hotel": np.repeat(self.hotels[hotel_idx], n_dates),
+                "room_type": np.repeat(self.room_types[room_type_idx], n_dates),
+                "date": np.tile(self.dates, len(hotel_idx)),
+                "n_occupied_rooms": self.counts[hotel_idx, room_type_idx].ravel(),
+            }
+        )
+
+    def room_count(self) -> pd.DataFrame:
+        """
+        The number of rooms is estimated by the maximum number of occupied rooms.
+
+        :return: DataFrame[hotel, room_type, n_rooms]
+        """
+        hotel_idx, room_type_idx = np.nonzero(self.has_room_type)
+
+        return pd.DataFrame(
+            {
+                "hotel": self.hotels[hotel_idx],
+                "room_type": self.room_types[room_type_idx],
+                "n_rooms": self.counts[hotel_idx, room_type_idx].max(axis=1, initial=0),
+            }
+        )
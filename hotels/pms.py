@@ -0,0 +1,260 @@
+"""
+The purpose of this module is to classify reservations by the guest flow of a date and to aggregate the snapshots of
+the Hotel PMS page
+
+Flow types of a reservation on a date D:
+
+- arrival: the guests arrive on D. (The reservation is not canceled before D.)
+- in-house: the guests arrived before D and stay the night of D.
+- departure: the guests leave the hotel on D.
+- non-related: otherwise
+
+The morning flow type is the state at the beginning of D. In the evening, arrived guests are in house (or they have
+already left if they checked out on D) and departed guests are non-related. An arrival which remains in the evening
+is a no-show.
+"""
+from typing import Literal, Optional
+import datetime as dt
+
+import numpy as np
+import pandas as pd
+
+from hotels import data_start_date, data_end_date_incl
+from hotels.models import ReservationStatus
+
+FlowType = Literal["arrival", "in-house", "departure", "non-related"]
+flow_type_dtype = pd.CategoricalDtype(["arrival", "in-house", "departure", "non-related"])
+
+## codes of flow_type_dtype
+_ARRIVAL, _IN_HOUSE, _DEPARTURE, _NON_RELATED = range(4)
+
+
+def _booking_arrays(df_booking: pd.DataFrame) -> dict[str, np.ndarray]:
+    return {
+        "arrival_date": df_booking["arrival_date"].to_numpy(dtype="datetime64[s]"),
+        "actual_departure_date": df_booking["actual_departure_date"].to_numpy(dtype="datetime64[s]"),
+        "reservation_status_date": df_booking["reservation_status_date"].to_numpy(dtype="datetime64[s]"),
+        "is_check_out": (df_booking["reservation_status"] == ReservationStatus.check_out.value).to_numpy(),
+    }
+
+
+def _flow_type_codes(arrays: dict[str, np.ndarray], date) -> (np.ndarray, np.ndarray):
+    """
+    :param arrays: see _booking_arrays()
+    :param date: datetime64[s] scalar or an array of the same length as the arrays
+    :return: codes of the morning and evening flow types
+    """
+    arrival_date = arrays["arrival_date"]
+    actual_departure_date = arrays["actual_departure_date"]
+    is_check_out = arrays["is_check_out"]
+
+    ## Regardless the reservation status, the guests checked in if the status is updated after the arrival date.
+    is_arrival = (arrival_date == date) & (arrays["reservation_status_date"] >= date)
+    is_in_house = is_check_out & (arrival_date < date) & (date < actual_departure_date)
+    is_departure = is_check_out & (actual_departure_date == date)
+
+    morning = np.select([is_arrival, is_in_house, is_departure], [_ARRIVAL, _IN_HOUSE, _DEPARTURE], _NON_RELATED)
+    evening = np.select(
+        [
+            is_arrival & is_check_out & (arrays["reservation_status_date"] == date),
+            is_arrival & is_check_out,
+            morning == _DEPARTURE,
+        ],
+        [_NON_RELATED, _IN_HOUSE, _NON_RELATED],
+        morning,
+    )
+    return morning.astype(np.int8), evening.astype(np.int8)
+
+
+def classify_flows_by_date(df_booking: pd.DataFrame, dates) -> pd.DataFrame:
+    """
+    Classify the reservations for all given dates at once.
+
+    A reservation is related to the dates from its arrival date to its actual departure date (or only to the arrival
+    date if it is not checked out). Every reservation is repeated for these dates as in reservations2actions().
+
+    A checked-out reservation whose actual departure date is before its arrival date is related only to the arrival
+    date, like a reservation which is not checked out.
+
+    :param df_booking: DataFrame[arrival_date, actual_departure_date, reservation_status, reservation_status_date]
+    :param dates: a date or dates to classify the reservations for
+    :return: DataFrame[date, flow_type_morning, flow_type_evening] of the pairs of a reservation and a date which are
+             related in the morning. The index is the index of df_booking.
+    """
+    dates = np.unique(pd.DatetimeIndex(np.atleast_1d(dates)).to_numpy(dtype="datetime64[s]"))
+    arrays = _booking_arrays(df_booking)
+
+    last_date = np.where(arrays["is_check_out"], arrays["actual_departure_date"], arrays["arrival_date"])
+    n_nights = (last_date - arrays["arrival_date"]).astype("timedelta64[D]").astype(np.int64)
+    n_dates = np.clip(n_nights, 0, None) + 1
+    last_date = arrays["arrival_date"] + (n_dates - 1).astype("timedelta64[D]")
+    if len(dates):
+        n_dates[(last_date < dates[0]) | (arrays["arrival_date"] > dates[-1])] = 0
+    else:
+        n_dates[:] = 0
+
+    starts = np.cumsum(n_dates) - n_dates
+    offsets = np.arange(n_dates.sum(), dtype=np.int64) - np.repeat(starts, n_dates)
+    arrays = {name: np.repeat(array, n_dates) for name, array in arrays.items()}
+    repeated_dates = arrays["arrival_date"] + offsets.astype("timedelta64[D]")
+
+    is_selected = np.isin(repeated_dates, dates)
+    arrays = {name: array[is_selected] for name, array in arrays.items()}
+    repeated_dates = repeated_dates[is_selected]
+    morning, evening = _flow_type_codes(arrays, repeated_dates)
+
+    is_related = morning != _NON_RELATED
+    return pd.DataFrame(
+        {
+            "date": repeated_dates[is_related],
+            "flow_type_morning": pd.Categorical.from_codes(morning[is_related], dtype=flow_type_dtype),
+            "flow_type_evening": pd.Categorical.from_codes(evening[is_related], dtype=flow_type_dtype),
+        },
+        index=np.repeat(df_booking.index, n_dates)[is_selected][is_related],
+    )
+
+
+## flow types which need the meal in the morning snapshot (see the Hotel PMS page)
+_meal2flow_types = {
+    "breakfast": ["in-house", "departure"],
+    "lunch": ["in-house"],
+    "dinner": ["arrival", "in-house"],
+}
+pms_period_dtype = pd.CategoricalDtype(["morning", "evening"])
+
+
+def aggregate_pms_snapshot(
+    df_booking: pd.DataFrame,
+    start_date: dt.date = data_start_date,
+    end_date: dt.date = data_end_date_incl,
+    hotels: Optional[list[str]] = None,
+) -> (pd.DataFrame, pd.DataFrame, pd.DataFrame):
+    """
+    The morning and evening snapshots of the Hotel PMS page for every hotel and date.
+
+    :param hotels: hotels of the snapshots. The hotels of df_booking by default.
+    :return: DataFrame[hotel, date, period, flow_type, n_rooms, n_adults, n_children, n_babies] (every combination),
+             DataFrame[hotel, date, n_breakfast, n_lunch, n_dinner] (every combination),
+             DataFrame[hotel, date, period, flow_type, reserved_room_type, assigned_room_type, n_rooms]
+    """
+    dates = pd.date_range(start_date, end_date, name="date")
+    df_booking = df_booking.reset_index(drop=True)
+    cols = ["hotel", "adults", "children", "babies", "n_lodgers", "reserved_room_type", "assigned_room_type"]
+    df = classify_flows_by_date(df_booking, dates).join(df_booking[cols + list(_meal2flow_types)])
+
+    df_guests = pd.concat(
+        [
+            df.assign(period="morning", flow_type=df["flow_type_morning"]),
+            df.assign(period="evening", flow_type=df["flow_type_evening"]).query("flow_type != 'non-related'"),
+        ],
+        ignore_index=True,
+    ).astype({"period": pms_period_dtype})
+
+    hotels = sorted(df_booking["hotel"].unique()) if hotels is None else hotels
+    related_flow_types = [flow_type for flow_type in flow_type_dtype.categories if flow_type != "non-related"]
+    flows_index = pd.MultiIndex.from_product(
+        [hotels, dates, pms_period_dtype.categories, related_flow_types], names=["hotel", "date", "period", "flow_type"]
+    )
+    df_flows = (
+        df_guests.groupby(["hotel", "date", "period", "flow_type"], observed=True)
+        .agg(
+            n_rooms=("adults", "size"),
+            n_adults=("adults", "sum"),
+            n_children=("children", "sum"),
+            n_babies=("babies", "sum"),
+        )
+        .reindex(flows_index, fill_value=0)
+        .reset_index()
+    )
+
+    df_morning = df_guests.query("period == 'morning'")
+    df_meals = (
+        df_morning[["hotel", "date"]]
+        .assign(
+            **{
+                f"n_{meal}": df_morning[meal] * df_morning["n_lodgers"] * df_morning["flow_type"].isin(flow_types)
+                for meal, flow_types in _meal2flow_types.items()
+            }
+        )
+        .groupby(["hotel", "date"], observed=True)
+        .sum()
+        .reindex(pd.MultiIndex.from_product([hotels, dates], names=["hotel", "date"]), fill_value=0)
+        .reset_index()
+    )
+
+    df_room_usage = (
+        df_guests.groupby(
+            ["hotel", "date", "period", "flow_type", "reserved_room_type", "assigned_room_type"], observed=True
+        )
+        .size()
+        .rename("n_rooms")
+        .reset_index()
+    )
+
+    categories = {"hotel": "category", "period": pms_period_dtype, "flow_type": flow_type_dtype}
+    return (
+        df_flows.astype(categories),
+        df_meals.astype({"hotel": "category"}),
+        df_room_usage.astype(categories),
+    )
+
+
+class ReservationIndex:
+    """
+    Reservations of each hotel sorted by arrival date.
+
+    A reservation can be related to a date D only if it arrives on D or it stays until D. Because no reservation stays
+    longer than max_stay days, the candidates are the reservations arriving between D - max_stay and D. They are
+    found by binary search and only they are classified with classify_flows_by_date().
+    """
+
+    def __init__(self, df_booking: pd.DataFrame):
+        """
+        :param df_booking: DataFrame[hotel, arrival_date, actual_departure_date, reservation_status,
+                                     reservation_status_date, ...]
+        """
+        self._empty = df_booking.iloc[:0]
+        self._frames: dict[str, pd.DataFrame] = {}
+        self._arrival_dates: dict[str, np.ndarray] = {}
+        self._max_stays: dict[str, np.timedelta64] = {}
+
+        for hotel, df in df_booking.groupby("hotel", observed=True):
+            df = df.sort_values("arrival_date", kind="stable")
+            arrays = _booking_arrays(df)
+            last_date = np.fmax(arrays["actual_departure_date"], arrays["reservation_status_date"])
+            max_stay = np.nanmax(last_date - arrays["arrival_date"]) if len(df) else np.timedelta64(0, "s")
+
+            self._frames[hotel] = df
+            self._arrival_dates[hotel] = arrays["arrival_date"]
+            self._max_stays[hotel] = max(max_stay, np.timedelta64(0, "s"))
+
+    def candidates(self, hotel: str, start_date, end_date=None) -> pd.DataFrame:
+        """
+        :param hotel: name of the hotel such as "City Hotel"
+        :param start_date: first date
+        :param end_date: last date (included). start_date by default.
+        :return: reservations of the hotel which can be related to a date between start_date and end_date
+        """
+        if hotel not in self._frames:
+            return self._empty
+        start_date = np.datetime64(pd.Timestamp(start_date), "s")
+        end_date = start_date if end_date is None else np.datetime64(pd.Timestamp(end_date), "s")
+
+        arrival_date = self._arrival_dates[hotel]
+        start = np.searchsorted(arrival_date, start_date - self._max_stays[hotel], side="left")
+        end = np.searchsorted(arrival_date, end_date, side="right")
+        return self._frames[hotel].iloc[start:end]
+
+    def lookup(self, hotel: str, date) -> pd.DataFrame:
+        """
+        :param hotel: name of the hotel such as "City Hotel"
+        :param date: date to look up
+        :return: reservations related to the date in the morning with the columns flow_type_morning and
+                 flow_type_evening (see classify_flows_by_date())
+        """
+        df = self.candidates(hotel, date)
+        df_flows = classify_flows_by_date(df.reset_index(drop=True), date)
+        return df.iloc[df_flows.index].assign(
+            flow_type_morning=df_flows["flow_type_morning"].to_numpy(),
+            flow_type_evening=df_flows["flow_type_evening"].to_numpy(),
+        )
@@ -0,0 +1,84 @@
+"""
+The purpose of this module is to collapse the long tail of a categorical field (country, agent, ...) into "other"
+"""
+import datetime as dt
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+
+def rank_categories(
+    df: pd.DataFrame,
+    cat_field: str,
+    metric_field: Optional[str] = None,
+    date_field: str = "date",
+    start_date: Optional[dt.date] = None,
+    end_date: Optional[dt.date] = None,
+) -> pd.DataFrame:
+    """
+    Rank the observed categories by the sum of the metric (in descending order).
+
+    :param df: DataFrame[cat_field, metric_field, date_field]
+    :param cat_field: categorical field such as country, market_segment, agent or distribution_channel
+    :param metric_field: metric to rank the categories by. The number of rows if None.
+    :param date_field: date column the ranking window is applied to
+    :param start_date: first date of the ranking window (inclusive). No limit if None.
+    :param end_date: last date of the ranking window (inclusive). No limit if None.
+    :return: DataFrame[cat_field, metric, rank] sorted by rank. rank is the "min" rank, so ties share a rank.
+    """
+    s_cat = df[cat_field] if isinstance(df[cat_field].dtype, pd.CategoricalDtype) else df[cat_field].astype("category")
+    codes = s_cat.cat.codes.to_numpy()
+    n_cats = len(s_cat.cat.categories)
+
+    in_window = codes >= 0
+    if start_date is not None:
+        in_window &= (df[date_field] >= pd.Timestamp(start_date)).to_numpy()
+    if end_date is not None:
+        in_window &= (df[date_field] <= pd.Timestamp(end_date)).to_numpy()
+
+    weights = None if metric_field is None else df[metric_field].to_numpy(dtype=np.float64)[in_window]
+    metric = np.bincount(codes[in_window], weights=weights, minlength=n_cats)
+    is_observed = np.bincount(codes[in_window], minlength=n_cats) > 0
+
+    df_rank = pd.DataFrame({cat_field: s_cat.cat.categories[is_observed], "metric": metric[is_observed]})
+    return (
+        df_rank.assign(rank=lambda x: x["metric"].rank(method="min", ascending=False).astype(np.int64))
+        .sort_values("rank", kind="stable")
+        .reset_index(drop=True)
+    )
+
+
+def rollup_top_n(
+    df: pd.DataFrame,
+    cat_field: str,
+    metric_field: Optional[str] = None,
+    n: int = 10,
+    date_field: str = "date",
+    start_date: Optional[dt.date] = None,
+    end_date: Optional[dt.date] = None,
+    other: str = "other",
+) -> pd.Series:
+    """
+    Keep the top n categories and replace the rest with `other`.
+
+    The categories are ranked in the window (see rank_categories()), but all rows are rolled up. Every old category
+    code is mapped to a new one through a lookup array, so the cost is one take over the codes. Missing values stay
+    missing.
+
+    :param n: number of categories to keep. More categories are kept if there is a tie at the n-th rank.
+    :param other: name of the category for the rest
+    :return: categorical Series with the index of df. The categories are the top n in rank order and then `other`.
+    """
+    s_cat = df[cat_field] if isinstance(df[cat_field].dtype, pd.CategoricalDtype) else df[cat_field].astype("category")
+    df_rank = rank_categories(df, cat_field, metric_field, date_field, start_date, end_date).query("rank <= @n")
+    top_cats = pd.Index(df_rank[cat_field])
+
+    ## lookup[old code] = new code. The last entry is for the missing values (code -1).
+    categories = top_cats if other in top_cats else top_cats.append(pd.Index([other]))
+    lookup = np.full(len(s_cat.cat.categories) + 1, categories.get_loc(other), dtype=np.int64)
+    lookup[s_cat.cat.categories.get_indexer(top_cats)] = np.arange(len(top_cats))
+    lookup[-1] = -1
+    codes = lookup[s_cat.cat.codes.to_numpy()]
+
+    return pd.Series(pd.Categorical.from_codes(codes, categories=categories), index=df.index, name=cat_field)
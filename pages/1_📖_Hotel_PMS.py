@@ -1,4 +1,3 @@
-from typing import Literal
 import datetime as dt
 
 import altair as alt
@@ -6,19 +5,68 @@ import pandas as pd
 import streamlit as st
 
 from hotels import data_start_date, data_end_date_incl
-from hotels.dashboard import set_page_config
-from hotels.load_data import load_booking_data
-from hotels.models import Hotel, ReservationStatus
+from hotels.dashboard import set_page_config, stop_if_missing
+from hotels.load_data import (
+    datasets,
+    load_booking_data,
+    load_pms_snapshot,
+    load_property_registry,
+    make_filters,
+    missing_outputs,
+    pms_snapshot_repo_paths,
+)
+from hotels.pms import ReservationIndex, aggregate_pms_snapshot
 
 set_page_config()
 
 _flow_type2flow_name = {"arrival": "Arrivals", "in-house": "in House (Occupied)", "departure": "Departures"}
-FlowType = Literal["arrival", "in-house", "departure", "non-related"]
+_booking_columns = [
+    "hotel",
+    "arrival_date",
+    "actual_departure_date",
+    "reservation_status",
+    "reservation_status_date",
+    "adults",
+    "children",
+    "babies",
+    "n_lodgers",
+    "reserved_room_type",
+    "assigned_room_type",
+    "breakfast",
+    "lunch",
+    "dinner",
+]
 
 
 @st.cache_data(ttl="1h")
-def load_data() -> pd.DataFrame:
-    return load_booking_data()
+def load_data(hotel: str) -> (pd.DataFrame, pd.DataFrame, pd.DataFrame):
+    """
+    :param hotel: name of the hotel such as "City Hotel"
+    :return: snapshots of the hotel indexed by date (see load_pms_snapshot())
+    """
+    df_flows, df_meals, df_room_usage = load_pms_snapshot(filters=make_filters(hotel=hotel))
+    return df_flows.set_index("date"), df_meals.set_index("date"), df_room_usage.set_index("date")
+
+
+@st.cache_resource(ttl="1h")
+def load_reservation_index(hotel: str) -> ReservationIndex:
+    return ReservationIndex(load_booking_data(columns=_booking_columns, filters=make_filters(hotel=hotel)))
+
+
+def load_snapshot(
+    hotel: str, start_date: pd.Timestamp, end_date: pd.Timestamp, from_snapshot: bool
+) -> (pd.DataFrame, pd.DataFrame, pd.DataFrame):
+    """
+    :param from_snapshot: True to read the tables of the pms_snapshot stage. Otherwise the snapshots of the dates are
+                          computed from the reservations which ReservationIndex finds for them.
+    :return: snapshots of the hotel indexed by date (at least from start_date to end_date)
+    """
+    if from_snapshot:
+        return load_data(hotel)
+
+    df_booking = load_reservation_index(hotel).candidates(hotel, start_date, end_date)
+    tables = aggregate_pms_snapshot(df_booking, start_date, end_date, hotels=[hotel])
+    return tuple(df.set_index("date") for df in tables)
 
 
 def infobox_guest_flow(flow_name: str, n_rooms: int = 0, n_adults: int = 0, n_children: int = 0, n_babies: int = 0):
@@ -35,48 +83,38 @@ def infobox_guest_flow(flow_name: str, n_rooms: int = 0, n_adults: int = 0, n_ch
     cols3.pop(0).metric("👶 Babies", n_babies)
 
 
-def find_flow_type(row: pd.Series, selected_date: dt.date) -> FlowType:
-    # return:arrival, in_house, departure
-    arrival_date = row["arrival_date"]
-    actual_departure_date = row["actual_departure_date"]
-    reservation_status = row["reservation_status"]
-    reservation_status_date = row["reservation_status_date"]
-
-    if arrival_date == selected_date and reservation_status_date >= selected_date:
-        # Regardless the reservation status, the guests checked in if reservation status is updated after the arrival date.
-        return "arrival"
-
-    elif reservation_status == ReservationStatus.check_out and arrival_date < selected_date < actual_departure_date:
-        return "in-house"
-
-    elif reservation_status == ReservationStatus.check_out and selected_date == actual_departure_date:
-        return "departure"
+def show_guest_flows(df_flows: pd.DataFrame):
+    """
+    :param df_flows: DataFrame[flow_type, n_rooms, n_adults, n_children, n_babies] of a date and a period
+    """
+    s_flows = df_flows.set_index("flow_type")
 
-    else:
-        return "non-related"
+    cols = st.columns(len(_flow_type2flow_name))
+    for i, (flow_type, flow_name) in enumerate(_flow_type2flow_name.items()):
+        with cols[i].container(border=True):
+            infobox_guest_flow(
+                flow_name,
+                n_rooms=int(s_flows.loc[flow_type, "n_rooms"]),
+                n_adults=int(s_flows.loc[flow_type, "n_adults"]),
+                n_children=int(s_flows.loc[flow_type, "n_children"]),
+                n_babies=int(s_flows.loc[flow_type, "n_babies"]),
+            )
 
 
-def show_meals_needed(df: pd.DataFrame):
+def show_meals_needed(s_meals: pd.Series):
     """
-    :param df: DataFrame[flow_type, breakfast, lunch, dinner, n_lodgers]
+    :param s_meals: Series[n_breakfast, n_lunch, n_dinner] of a date
     """
     st.subheader("Meals needed")
 
-    def count_meals(data: pd.DataFrame, field: str) -> int:
-        return (data[field] * data["n_lodgers"]).sum()
-
-    n_breakfast = count_meals(df.query("flow_type in ('in-house', 'departure')"), "breakfast")
-    n_lunch = count_meals(df.query("flow_type == 'in-house'"), "lunch")
-    n_dinner = count_meals(df.query("flow_type in ('arrival', 'in-house')"), "dinner")
-
-    st.metric("🍳 Breakfast", n_breakfast)
-    st.metric("🍱 Lunch", n_lunch)
-    st.metric("🍽️ Dinner", n_dinner)
+    st.metric("🍳 Breakfast", int(s_meals["n_breakfast"]))
+    st.metric("🍱 Lunch", int(s_meals["n_lunch"]))
+    st.metric("🍽️ Dinner", int(s_meals["n_dinner"]))
 
 
 def show_room_usage(df: pd.DataFrame):
     """
-    :param df: DataFrame[flow_type, reserved_room_type, assigned_room_type]
+    :param df: DataFrame[flow_type, reserved_room_type, assigned_room_type, n_rooms]
     """
     st.subheader("Room usage")
 
@@ -87,7 +125,7 @@ def show_room_usage(df: pd.DataFrame):
         alt.Chart(df)
         .mark_bar()
         .encode(
-            x=alt.X("count()").title("number of rooms"),
+            x=alt.X("sum(n_rooms)").title("number of rooms"),
             color=alt.Color("flow_type").scale(domain=flow_types),
         )
     )  # type: alt.Chart
@@ -112,79 +150,89 @@ def show_room_usage(df: pd.DataFrame):
     cols[1].altair_chart(chart_new, use_container_width=True)
 
 
-def show_morning_tab(df_selected_date: pd.DataFrame):
-    st.header("☀️ Good Morning!")
+def show_snapshot_tab(
+    period: str,
+    selected_date: pd.Timestamp,
+    df_flows: pd.DataFrame,
+    df_meals: pd.DataFrame,
+    df_room_usage: pd.DataFrame,
+):
+    """
+    :param period: morning or evening
+    """
+    df_flows_date = df_flows.loc[[selected_date]].query("period == @period")
+    df_room_usage_date = df_room_usage.loc[df_room_usage.index == selected_date].query("period == @period")
 
-    cols = st.columns(len(_flow_type2flow_name))
-    for i, (flow_type, flow_name) in enumerate(_flow_type2flow_name.items()):
-        with cols[i].container(border=True):
-            df = df_selected_date.query("flow_type == @flow_type")
-
-            infobox_guest_flow(
-                flow_name,
-                n_rooms=len(df),
-                n_adults=df["adults"].sum(),
-                n_children=df["children"].sum(),
-                n_babies=df["babies"].sum(),
-            )
+    show_guest_flows(df_flows_date)
 
     cols = st.columns([1, 4])
     with cols[0].container(border=True):
-        show_meals_needed(df_selected_date)
+        ## meals are prepared for the guests in the morning snapshot
+        show_meals_needed(df_meals.loc[selected_date])
 
     with cols[1].container(border=True):
-        show_room_usage(df_selected_date)
-
-
-def show_evening_tab(selected_hotel: Hotel, selected_date: dt.date, df_selected_date: pd.DataFrame):
-    st.header("🌙 Good Evening!")
-
-    def flow_type_evening(r: pd.Series) -> FlowType:
-        flow_type: FlowType = r["flow_type"]
-
-        if flow_type == "arrival" and r["reservation_status"] == ReservationStatus.check_out:
-            if r["reservation_status_date"] == selected_date:
-                return "non-related"
-            else:
-                return "in-house"
-        elif flow_type == "departure":
-            return "non-related"
-        else:
-            return flow_type
-
-    df_evening = df_selected_date.assign(
-        flow_type_morning=df_selected_date["flow_type"], flow_type=df_selected_date.apply(flow_type_evening, axis=1)
+        show_room_usage(df_room_usage_date)
+
+
+def show_trends_tab(selected_hotel: str, selected_date: pd.Timestamp, from_snapshot: bool):
+    start_date, end_date = st.slider(
+        "Date range",
+        min_value=pd.Timestamp(data_start_date).to_pydatetime(),
+        max_value=pd.Timestamp(data_end_date_incl).to_pydatetime(),
+        value=(
+            max(selected_date - pd.Timedelta(days=14), pd.Timestamp(data_start_date)).to_pydatetime(),
+            min(selected_date + pd.Timedelta(days=14), pd.Timestamp(data_end_date_incl)).to_pydatetime(),
+        ),
+        format="YYYY-MM-DD",
     )
-    df_evening.query("flow_type != 'non-related'", inplace=True)
-
-    cols = st.columns(3)
-    for i, (flow_type, flow_name) in enumerate(_flow_type2flow_name.items()):
-        with cols[i].container(border=True):
-            df = df_evening.query("flow_type == @flow_type")
-            infobox_guest_flow(
-                flow_name,
-                n_rooms=len(df),
-                n_adults=df["adults"].sum(),
-                n_children=df["children"].sum(),
-                n_babies=df["babies"].sum(),
-            )
+    df_flows, df_meals, _ = load_snapshot(selected_hotel, start_date, end_date, from_snapshot)
 
-    cols = st.columns([1, 4])
-    with cols[0].container(border=True):
-        show_meals_needed(df_selected_date)
+    df_flows_range = df_flows.loc[start_date:end_date].query("period == 'morning'").reset_index()
+    chart_flows = (
+        alt.Chart(df_flows_range)
+        .mark_line(point=True)
+        .encode(
+            x=alt.X("yearmonthdate(date)").title("date"),
+            y=alt.Y("n_rooms").title("number of rooms"),
+            color=alt.Color("flow_type").scale(domain=list(_flow_type2flow_name)),
+        )
+        .properties(title="Guest flows in the morning")
+    )
+    st.altair_chart(chart_flows, use_container_width=True)
 
-    with cols[1].container(border=True):
-        show_room_usage(df_evening)
+    df_meals_range = (
+        df_meals.loc[start_date:end_date, ["n_breakfast", "n_lunch", "n_dinner"]]
+        .reset_index()
+        .melt(id_vars="date", var_name="meal", value_name="n_meals")
+    )
+    chart_meals = (
+        alt.Chart(df_meals_range)
+        .mark_line(point=True)
+        .encode(
+            x=alt.X("yearmonthdate(date)").title("date"),
+            y=alt.Y("n_meals").title("number of meals"),
+            color="meal",
+        )
+        .properties(title="Meals needed")
+    )
+    st.altair_chart(chart_meals, use_container_width=True)
 
 
 if __name__ == "__main__":
     st.title("📖 Hotel PMS Dashboard")
-    df_booking = load_data()
+    from_snapshot = not missing_outputs(pms_snapshot_repo_paths)
+    if not from_snapshot:
+        stop_if_missing([datasets["bookings"][0]])
+        st.info("The pms_snapshot stage has not been run for this data source. The dates are computed from bookings.")
 
     with st.sidebar:
         st.subheader("Hotel")
-        selected_hotel = st.radio(
-            label="hotel", options=list(Hotel), index=0, format_func=lambda h: h.value, label_visibility="collapsed"
+        selected_hotel = st.selectbox(
+            label="hotel",
+            options=load_property_registry(),
+            index=0,
+            format_func=lambda p: p.name,
+            label_visibility="collapsed",
         )
 
         today = dt.date.today().replace(year=2016)
@@ -195,17 +243,21 @@ if __name__ == "__main__":
         )
         st.info(f"Any date between {data_start_date} and {data_end_date_incl}")
 
-    df_selected_date = df_booking.query("hotel == @selected_hotel").drop(columns=["hotel"], inplace=False)
-    df_selected_date["flow_type"] = df_selected_date.apply(find_flow_type, selected_date=selected_date, axis=1)
-    df_selected_date.query("flow_type != 'non-related'", inplace=True)
+    df_flows, df_meals, df_room_usage = load_snapshot(selected_hotel.name, selected_date, selected_date, from_snapshot)
 
-    morning_tab, evening_tab, readme_tab = st.tabs(["☀️ Morning", "🌙 Evening", "👀 README"])
+    morning_tab, evening_tab, trends_tab, readme_tab = st.tabs(["☀️ Morning", "🌙 Evening", "📈 Trends", "👀 README"])
 
     with morning_tab:
-        show_morning_tab(df_selected_date)
+        st.header("☀️ Good Morning!")
+        show_snapshot_tab("morning", selected_date, df_flows, df_meals, df_room_usage)
 
     with evening_tab:
-        show_evening_tab(selected_hotel, selected_date, df_selected_date)
+        st.header("🌙 Good Evening!")
+        show_snapshot_tab("evening", selected_date, df_flows, df_meals, df_room_usage)
+
+    with trends_tab:
+        st.header("📈 Trends")
+        show_trends_tab(selected_hotel.name, selected_date, from_snapshot)
 
     with readme_tab:
         st.markdown(
@@ -244,6 +296,10 @@ if __name__ == "__main__":
         The state of the dashboard if you open the dashboard at the end of the day: all new guests arrived and ones who 
         have to leave left. If you still see a positive number in Arrival section, they are "No-Show".
         
+        ### 📈 Trends Tab
+        
+        The guest flows in the morning and the meals needed over a range of dates.
+        
         ### References
         
         - [What is a Hotel Property Management System (PMS)?](https://www.oracle.com/hospitality/what-is-hotel-pms/)
@@ -1,56 +1,55 @@
+from typing import Union
+
 import altair as alt
+import numpy as np
 import pandas as pd
 import streamlit as st
 
 from hotels import data_start_date, data_end_date_incl
+from hotels.dashboard import load_dataset, prepare_time_unit_data
 from hotels.models import TUTransform
-from hotels.load_data import load_country_code_mapping
+from hotels.load_data import DatasetHandle, load_country_code_mapping
 
 
-def compute_cancellation_rate(data: pd.DataFrame) -> pd.Series:
-    """
-    :return: Series[arrival_date, cancelled, checked-in, n_reservations, r_cancellation]
+def compute_cancellation_rate(data: pd.DataFrame, by: Union[str, list[str]]) -> pd.DataFrame:
     """
-    n_checked_in = len(data.query("is_canceled == 0"))
-    n_cancelled = len(data.query("is_canceled == 1"))
-    n_reservations = n_checked_in + n_cancelled
-    r_cancellation = n_cancelled / n_reservations
+    Count the cancellations of each group in one pass. The number of cancellations is the sum of is_canceled.
 
-    return pd.Series(
-        {
-            "cancelled": n_cancelled,
-            "checked-in": n_checked_in,
-            "n_reservations": n_reservations,
-            "r_cancellation": r_cancellation,
-        }
+    :param data: DataFrame[is_canceled, ...]
+    :param by: grouping key(s) such as arrival_date, country, lead_time or market_segment
+    :return: DataFrame[*by, cancelled, checked-in, n_reservations, r_cancellation]
+    """
+    df = (
+        data.groupby(by, observed=True)["is_canceled"]
+        .agg(cancelled="sum", n_reservations="size")
+        .astype("int64")
+        .reset_index()
     )
+    df.insert(df.columns.get_loc("n_reservations"), "checked-in", df["n_reservations"] - df["cancelled"])
+    df["r_cancellation"] = df["cancelled"] / df["n_reservations"]
+    return df
 
 
 @st.cache_data
-def compute_cancellation_rate_by_day(df_booking: pd.DataFrame) -> pd.DataFrame:
+def compute_cancellation_rate_by_day(bookings: DatasetHandle) -> pd.DataFrame:
     """
     :return: DataFrame[arrival_date, cancelled, checked-in, n_reservations, r_cancellation]
     """
-    df_cancellations = (
-        df_booking.query("@data_start_date <= arrival_date <= @data_end_date_incl")
-        .groupby("arrival_date")
-        .apply(compute_cancellation_rate)
-        .reset_index()
+    return compute_cancellation_rate(
+        load_dataset(bookings).query("@data_start_date <= arrival_date <= @data_end_date_incl"), by="arrival_date"
     )
-    return df_cancellations
 
 
 @st.cache_data
-def compute_cancellation_rate_by_country(df_booking: pd.DataFrame) -> pd.DataFrame:
+def compute_cancellation_rate_by_country(bookings: DatasetHandle) -> pd.DataFrame:
+    """
+    :return: DataFrame[country, cancelled, checked-in, n_reservations, r_cancellation]
+    """
     country_mapping = load_country_code_mapping()
 
-    df_cancellations = (
-        df_booking.query("@data_start_date <= arrival_date <= @data_end_date_incl")
-        .groupby("country")
-        .apply(compute_cancellation_rate)
-        .reset_index()
-        .assign(country=lambda x: x["country"].apply(lambda x: country_mapping.get(x, x)))
-    )
+    df_cancellations = compute_cancellation_rate(
+        load_dataset(bookings).query("@data_start_date <= arrival_date <= @data_end_date_incl"), by="country"
+    ).assign(country=lambda x: x["country"].apply(lambda x: country_mapping.get(x, x)))
     return df_cancellations
 
 
@@ -68,15 +67,22 @@ def draw_cancellation_counts(df_cancellations: pd.DataFrame, tu_transform: TUTra
     cols.pop(0).metric("Number of cancellations", n_cancelled)
     cols.pop(0).metric("Cancellation rate", f"{n_cancelled/n_reservations:0.1%}")
 
+    data_chart, min_date, max_date = prepare_time_unit_data(
+        df_cancellations[["arrival_date", "checked-in", "cancelled", "n_reservations"]],
+        tu_transform,
+        ["checked-in", "cancelled", "n_reservations"],
+        agg="sum",
+        date_field="arrival_date",
+    )
     chart_base: alt.Chart = (
-        alt.Chart(df_cancellations)
+        alt.Chart(data_chart)
         .transform_timeunit(date=f"{tu_transform}(arrival_date)")
         .transform_aggregate(
             total_checked_in="sum(checked-in)",
             total_cancellations="sum(cancelled)",
             total_reservations="sum(n_reservations)",
-            min_date="min(arrival_date)",
-            max_date="max(arrival_date)",
+            min_date=f"min({min_date})",
+            max_date=f"max({max_date})",
             groupby=["date"],
         )
         .transform_calculate(cancellation_rate="datum.total_cancellations / datum.total_reservations")
@@ -102,9 +108,9 @@ def draw_cancellation_counts(df_cancellations: pd.DataFrame, tu_transform: TUTra
     st.altair_chart(chart, use_container_width=True)
 
 
-def draw_cancellation_rate_by_country(df_booking: pd.DataFrame):
+def draw_cancellation_rate_by_country(bookings: DatasetHandle):
     st.subheader("Cancellation Rate by country (with &geq; 100 reservations)", help="")
-    df_cancellations_by_country = compute_cancellation_rate_by_country(df_booking).query("n_reservations >= 100")
+    df_cancellations_by_country = compute_cancellation_rate_by_country(bookings).query("n_reservations >= 100")
 
     chart_base: alt.Chart = alt.Chart(df_cancellations_by_country).encode(
         x=alt.X("r_cancellation").title("Cancellation Rate").axis(format="%"),
@@ -129,11 +135,14 @@ def draw_cancellation_rate_by_country(df_booking: pd.DataFrame):
 def draw_cancellation_rate_by_lead_time(df_booking: pd.DataFrame, upper_limit: int):
     st.subheader("Cancellation Rate by Lead Time", help="The time granularity is not applied.")
 
-    df_truncated = df_booking.query("lead_time <= @upper_limit")
-    df = pd.crosstab(df_truncated["lead_time"], df_truncated["is_canceled"]).reset_index()
-    df.rename(columns={0: "n_checked_in", 1: "n_cancel"}, inplace=True)
-    df["total"] = df["n_checked_in"] + df["n_cancel"]
-    df["r_cancel"] = df["n_cancel"] / df["total"]
+    df = compute_cancellation_rate(df_booking.query("lead_time <= @upper_limit"), by="lead_time").rename(
+        columns={
+            "checked-in": "n_checked_in",
+            "cancelled": "n_cancel",
+            "n_reservations": "total",
+            "r_cancellation": "r_cancel",
+        }
+    )
 
     chart_base: alt.Chart = alt.Chart(df).encode(
         x=alt.X("lead_time").title("Lead Time").scale(domainMin=0, domainMax=upper_limit),
@@ -170,16 +179,19 @@ def draw_no_show_counts_by_day(df_booking: pd.DataFrame, tu_transform: TUTransfo
         else:
             col.metric(key, value, help="statistics by day")
 
+    data_chart, min_date, max_date = prepare_time_unit_data(
+        df_count_no_show, tu_transform, ["count"], agg="sum", date_field="arrival_date"
+    )
     chart = (
-        alt.Chart(df_count_no_show)
+        alt.Chart(data_chart)
         .mark_bar()
         .encode(
             x=f"{tu_transform}(arrival_date)",
             y=alt.Y("sum(count)").title("count"),
             tooltip=[
                 alt.Tooltip(f"{tu_transform}(arrival_date)", title="Arrival date"),
-                alt.Tooltip("min(arrival_date)", title="Arrival date from"),
-                alt.Tooltip("max(arrival_date)", title="Arrival date to"),
+                alt.Tooltip(f"min({min_date})", title="Arrival date from"),
+                alt.Tooltip(f"max({max_date})", title="Arrival date to"),
                 alt.Tooltip("sum(count)", title="no-show count"),
             ],
         )
@@ -187,7 +199,76 @@ def draw_no_show_counts_by_day(df_booking: pd.DataFrame, tu_transform: TUTransfo
     st.altair_chart(chart, use_container_width=True)
 
 
-def draw_cohort_analysis_for_survival_rate(df_booking: pd.DataFrame):
+@st.cache_data
+def compute_survival_rate_matrix(bookings: DatasetHandle, bin_width: int = 7) -> pd.DataFrame:
+    """
+    Survival rates of the lead time cohorts by the time elapsed since the reservation.
+
+    The cancellations are counted in a 2D histogram (lead_time_cohort x time_elapsed_bin) and accumulated along the
+    time elapsed axis. Cohort c contains the reservations with lead time in [(c-1) * bin_width + 1, c * bin_width]
+    (cohort 0: lead time = 0) and the time elapsed is binned in the same way. Only the bins 0, ..., c are kept for
+    cohort c, because a reservation is no longer cancelled after its arrival.
+
+    :param bookings: handle of the bookings
+    :param bin_width: width of the bins in days
+    :return: DataFrame[lead_time_cohort, time_elapsed_bin, n_cancel, min_time_elapsed, max_time_elapsed,
+                       min_lead_time, max_lead_time, cumsum_cancel, survival_rate]
+             (the min/max columns are statistics of the cancellations in the cell)
+    """
+    df_booking = load_dataset(bookings)
+    lead_time = df_booking["lead_time"].to_numpy().astype(np.int64)
+    time_elapsed = (df_booking["reservation_status_date"] - df_booking["reservation_date"]).dt.days.to_numpy()
+    lead_time_cohort = (lead_time + bin_width - 1) // bin_width
+    time_elapsed_bin = (time_elapsed + bin_width - 1) // bin_width
+
+    n_cohorts = lead_time_cohort.max() + 1 if len(df_booking) else 0
+    cohort_sizes = np.bincount(lead_time_cohort, minlength=n_cohorts)
+
+    is_counted = (
+        (df_booking["is_canceled"].to_numpy() == 1) & (0 <= time_elapsed_bin) & (time_elapsed_bin <= lead_time_cohort)
+    )
+    n_cancel = np.bincount(
+        lead_time_cohort[is_counted] * n_cohorts + time_elapsed_bin[is_counted], minlength=n_cohorts * n_cohorts
+    ).reshape(n_cohorts, n_cohorts)
+    cumsum_cancel = np.cumsum(n_cancel, axis=1)
+
+    cohorts, bins = np.nonzero(
+        (np.arange(n_cohorts)[None, :] <= np.arange(n_cohorts)[:, None]) & (cohort_sizes[:, None] > 0)
+    )
+    df_survival_rate = pd.DataFrame(
+        {
+            "lead_time_cohort": cohorts,
+            "time_elapsed_bin": bins,
+            "n_cancel": n_cancel[cohorts, bins],
+            "cumsum_cancel": cumsum_cancel[cohorts, bins],
+            "survival_rate": 1 - cumsum_cancel[cohorts, bins] / cohort_sizes[cohorts],
+        }
+    )
+
+    df_stats = (
+        pd.DataFrame(
+            {
+                "lead_time_cohort": lead_time_cohort[is_counted],
+                "time_elapsed_bin": time_elapsed_bin[is_counted],
+                "time_elapsed": time_elapsed[is_counted],
+                "lead_time": lead_time[is_counted],
+            }
+        )
+        .groupby(["lead_time_cohort", "time_elapsed_bin"])
+        .agg(
+            min_time_elapsed=("time_elapsed", "min"),
+            max_time_elapsed=("time_elapsed", "max"),
+            min_lead_time=("lead_time", "min"),
+            max_lead_time=("lead_time", "max"),
+        )
+        .reset_index()
+    )
+    columns = ["lead_time_cohort", "time_elapsed_bin", "n_cancel", "min_time_elapsed", "max_time_elapsed"]
+    columns += ["min_lead_time", "max_lead_time", "cumsum_cancel", "survival_rate"]
+    return df_survival_rate.merge(df_stats, how="left", on=["lead_time_cohort", "time_elapsed_bin"])[columns]
+
+
+def draw_cohort_analysis_for_survival_rate(bookings: DatasetHandle, bin_width: int = 7):
     st.subheader("Survival Rate")
 
     st.markdown(
@@ -207,47 +288,11 @@ def draw_cohort_analysis_for_survival_rate(df_booking: pd.DataFrame):
     - The survival rate is smaller than 60% if the lead time is longer than 84 days. (lead time cohort number &geq; 13.)
     """
     )
-    r_cancellation_rate = df_booking["is_canceled"].mean()
+    r_cancellation_rate = load_dataset(bookings)["is_canceled"].mean()
     survival_rate = 1 - r_cancellation_rate
     st.metric("survival rate (final state)", f"{survival_rate:0.2%}")
 
-    df_survival_rate = df_booking[
-        ["is_canceled", "lead_time", "reservation_status_date", "reservation_date", "arrival_date"]
-    ].assign(
-        time_elapsed=lambda x: (x["reservation_status_date"] - x["reservation_date"]).dt.days,
-        lead_time_cohort=lambda x: (x["lead_time"] + 6) // 7,
-        time_elapsed_bin=lambda x: (x["time_elapsed"] + 6) // 7,
-    )
-
-    def _compute_survival_date(data: pd.DataFrame) -> pd.DataFrame:
-        lead_time_cohort = data["lead_time_cohort"].iloc[0]
-        n_reservations = len(data)
-        gb = data.query("is_canceled == 1").groupby(["lead_time_cohort", "time_elapsed_bin"])
-
-        df = gb.agg(
-            n_cancel=("lead_time", "size"),
-            min_time_elapsed=("time_elapsed", "min"),
-            max_time_elapsed=("time_elapsed", "max"),
-            min_lead_time=("lead_time", "min"),
-            max_lead_time=("lead_time", "max"),
-        ).reset_index()
-
-        df = (
-            pd.DataFrame({"lead_time_cohort": lead_time_cohort, "time_elapsed_bin": range(0, lead_time_cohort + 1)})
-            .merge(df, how="left")
-            .fillna({"n_cancel": 0})
-            .sort_values(by="time_elapsed_bin")
-            .assign(cumsum_cancel=lambda x: x["n_cancel"].cumsum())
-        )
-
-        df["survival_rate"] = 1 - df["cumsum_cancel"] / n_reservations
-        return df
-
-    df_survival_rate = (
-        df_survival_rate.groupby("lead_time_cohort", as_index=False)
-        .apply(_compute_survival_date)
-        .reset_index(drop=True)
-    )
+    df_survival_rate = compute_survival_rate_matrix(bookings, bin_width=bin_width)
 
     chart_survival_rate_base: alt.Chart = (
         alt.Chart(df_survival_rate)
@@ -286,11 +331,12 @@ def draw_cohort_analysis_for_survival_rate(df_booking: pd.DataFrame):
     st.altair_chart(chart_survival_rate, use_container_width=True)
 
 
-def show_cancellation_tab(df_booking: pd.DataFrame, tu_transform: TUTransform):
+def show_cancellation_tab(bookings: DatasetHandle, tu_transform: TUTransform):
     st.header("Cancellations")
-    df_cancellations = compute_cancellation_rate_by_day(df_booking)
+    df_booking = load_dataset(bookings)
+    df_cancellations = compute_cancellation_rate_by_day(bookings)
     draw_cancellation_counts(df_cancellations, tu_transform)
-    draw_cancellation_rate_by_country(df_booking)
+    draw_cancellation_rate_by_country(bookings)
     draw_cancellation_rate_by_lead_time(df_booking, upper_limit=365)
-    draw_cohort_analysis_for_survival_rate(df_booking)
+    draw_cohort_analysis_for_survival_rate(bookings)
     draw_no_show_counts_by_day(df_booking, tu_transform)
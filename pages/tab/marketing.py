@@ -3,25 +3,18 @@ import pandas as pd
 import streamlit as st
 
 from hotels import data_start_date, data_end_date_incl
-from hotels.dashboard import draw_kpi_by_cat
+from hotels.dashboard import draw_kpi_by_cat, load_dataset
+from hotels.load_data import DatasetHandle
 from hotels.models import TUTransform
+from hotels.rollup import rollup_top_n
 
 
 @st.cache_data
-def compute_actions_ext(df_booking: pd.DataFrame, df_actions: pd.DataFrame) -> pd.DataFrame:
-    cols = ["hotel", "reservation_id", "adults", "children", "babies", "n_lodgers", "sales", "country"]
-    df_actions_ext = df_actions.merge(
-        df_booking.assign(sales=lambda x: x["adr"] * x["n_nights"] / x["n_stay_actual"])[cols]
-    ).query("action != 'departure'")
-    return df_actions_ext
-
-
-@st.cache_data
-def compute_count_family(df_actions_ext: pd.DataFrame) -> pd.DataFrame:
+def compute_count_family(facts: DatasetHandle) -> pd.DataFrame:
     df_count_family = (
-        df_actions_ext.assign(is_family=lambda x: x["children"] + x["babies"] > 0)
-        .groupby(["date", "is_family"])
-        .size()
+        load_dataset(facts)
+        .groupby(["date", "is_family"])["n_occupied_rooms"]
+        .sum()
         .rename("n_reservations")
         .reset_index()
         .pivot_table(index="date", columns="is_family", values="n_reservations", aggfunc="sum", fill_value=0)
@@ -31,19 +24,15 @@ def compute_count_family(df_actions_ext: pd.DataFrame) -> pd.DataFrame:
     return df_count_family
 
 
-def draw_line_charts_top10(df_actions_ext: pd.DataFrame, tu_transform: TUTransform, cat_field: str, kpi_field: str):
-    top10_cats = (
-        df_actions_ext.groupby(cat_field, as_index=False)[kpi_field]
-        .sum()
-        .assign(rank=lambda x: x[kpi_field].rank(method="min", ascending=False))
-        .sort_values(by="rank", ascending=True)
-        .query("rank <= 10")[cat_field]
-        .to_list()
-    )
-
+def draw_line_charts_top_n(
+    df_facts: pd.DataFrame, tu_transform: TUTransform, cat_field: str, kpi_field: str, n: int = 10
+):
+    """
+    Line charts of the top n categories by the KPI. The other categories are summed up as "other".
+    """
     df_kpi_by_cat: pd.DataFrame = (
-        df_actions_ext.assign(country=lambda x: x[cat_field].apply(lambda c: c if c in top10_cats else "other"))
-        .groupby(["date", cat_field])[kpi_field]
+        df_facts.assign(**{cat_field: rollup_top_n(df_facts, cat_field, kpi_field, n=n)})
+        .groupby(["date", cat_field], observed=True)[kpi_field]
         .sum()
         .reset_index()
     )
@@ -52,26 +41,22 @@ def draw_line_charts_top10(df_actions_ext: pd.DataFrame, tu_transform: TUTransfo
     st.altair_chart(chart, use_container_width=True)
 
 
-def show_marketing_tab(
-    df_booking: pd.DataFrame,
-    df_actions: pd.DataFrame,
-    tu_transform: TUTransform,
-):
+def show_marketing_tab(bookings: DatasetHandle, facts: DatasetHandle, tu_transform: TUTransform):
     st.header("Marketing")
-
-    df_actions_ext = compute_actions_ext(df_booking, df_actions)
+    df_booking = load_dataset(bookings)
+    df_facts = load_dataset(facts)
 
     st.subheader("Number of guests by country")
     kpi_field = "number of guests"
-    draw_line_charts_top10(df_actions_ext.rename(columns={"n_lodgers": kpi_field}), tu_transform, "country", kpi_field)
+    draw_line_charts_top_n(df_facts.rename(columns={"n_guests": kpi_field}), tu_transform, "country", kpi_field)
 
     st.subheader("Sales by country")
     kpi_field = "sales"
-    draw_line_charts_top10(df_actions_ext, tu_transform, "country", kpi_field)
+    draw_line_charts_top_n(df_facts, tu_transform, "country", kpi_field)
 
     st.subheader("Number of reservations of families")
 
-    df_count_family = compute_count_family(df_actions_ext)
+    df_count_family = compute_count_family(facts)
     chart_family_count = draw_kpi_by_cat(df_count_family, tu_transform, "is_family", "number of reservations")
     st.altair_chart(chart_family_count, use_container_width=True)
 
@@ -92,7 +77,10 @@ def show_marketing_tab(
     df_not_cancelled = df_booking.query("is_canceled == 0")
 
     df_segment_vs_channel = (
-        pd.crosstab(df_not_cancelled["market_segment"], df_not_cancelled["distribution_channel"])
+        pd.crosstab(
+            df_not_cancelled["market_segment"].cat.remove_unused_categories(),
+            df_not_cancelled["distribution_channel"].cat.remove_unused_categories(),
+        )
         .reset_index()
         .melt(id_vars="market_segment", value_name="count")
     )
@@ -2,37 +2,25 @@ import pandas as pd
 import streamlit as st
 
 from hotels import data_start_date, data_end_date_incl
-from hotels.dashboard import draw_daily_kpi_with_quoters, draw_kpi_by_cat
+from hotels.dashboard import draw_daily_kpi_with_quoters, draw_kpi_by_cat, load_dataset, load_room_usage
+from hotels.load_data import DatasetHandle
 from hotels.models import TUTransform
 
 
 @st.cache_data
-def compute_sales_by_day(df_booking: pd.DataFrame, df_actions: pd.DataFrame) -> pd.DataFrame:
+def compute_sales_by_day(facts: DatasetHandle) -> pd.DataFrame:
     """
     :return: DataFrame[hotel, date, room_type, sales]
     """
-    df_adr_corrected = df_booking.assign(sales=lambda x: x["adr"] * x["n_nights"] / x["n_stay_actual"])[
-        ["hotel", "reservation_id", "assigned_room_type", "sales"]
-    ].rename(columns={"assigned_room_type": "room_type"})
-
-    df_sales = (
-        df_actions.merge(df_adr_corrected)
-        .query("action != 'departure'")
-        .groupby(["hotel", "date", "room_type"], as_index=False)["sales"]
-        .sum()
-    )
+    df_sales = load_dataset(facts).groupby(["hotel", "date", "room_type"], as_index=False, observed=True)["sales"].sum()
     return df_sales
 
 
-def show_sales_tab(
-    df_booking: pd.DataFrame,
-    df_actions: pd.DataFrame,
-    df_room_usage: pd.DataFrame,
-    tu_transform: TUTransform,
-):
+def show_sales_tab(bookings: DatasetHandle, facts: DatasetHandle, tu_transform: TUTransform):
     st.header("Sales")
 
-    df_sales = compute_sales_by_day(df_booking, df_actions).query("@data_start_date <= date <= @data_end_date_incl")
+    df_room_usage, _ = load_room_usage(bookings)
+    df_sales = compute_sales_by_day(facts).query("@data_start_date <= date <= @data_end_date_incl")
 
     chart = draw_daily_kpi_with_quoters(
         df_sales.groupby("date")["sales"].sum().reset_index(), tu_transform=tu_transform
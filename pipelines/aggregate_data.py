@@ -1,26 +1,214 @@
+import hashlib
+import json
+import shutil
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
 import pandas as pd
-from tqdm.auto import tqdm
 
-from hotels.load_data import load_booking_data, actions_data_path
+from hotels.load_data import (
+    load_booking_data,
+    load_action_data,
+    numpy_backed,
+    actions_data_path,
+    daily_facts_data_path,
+    pms_flows_data_path,
+    pms_meals_data_path,
+    pms_room_usage_data_path,
+    parquet_row_group_size,
+)
+from hotels.pms import aggregate_pms_snapshot
+from pipelines.parallel import map_partitions
+
+## Bump this version if the content of the action table changes, so that all partitions are rebuilt.
+ACTIONS_LAYOUT_VERSION = 2
+ACTIONS_MANIFEST_NAME = "_partitions.json"  ## files starting with "_" are ignored by parquet readers
 
-tqdm.pandas()
+_partition_source_cols = ["reservation_id", "arrival_date", "n_stay_actual"]
 
 
 def _reservation2actions(row: pd.Series) -> pd.DataFrame:
+    """
+    Row-wise version of reservations2actions(). This is kept as the reference implementation.
+    """
     stays = pd.date_range(row["arrival_date"], row["actual_departure_date"])
     actions = ["arrival"] + ["stay"] * (len(stays) - 2) + ["departure"]
     return pd.DataFrame({"reservation_id": row["reservation_id"], "date": stays, "action": actions})
 
 
+def reservations2actions(df_booking: pd.DataFrame) -> pd.DataFrame:
+    """
+    Explode each reservation into one row per date from arrival_date to actual_departure_date (both inclusive).
+
+    Instead of building a date range for each reservation, we repeat every reservation (n_stay_actual + 1) times
+    and compute the offset from arrival_date by a cumulative sum. The result (including its index) is identical to
+    the concatenation of _reservation2actions() over all rows.
+
+    :param df_booking: DataFrame[reservation_id, arrival_date, n_stay_actual] of reservations with n_stay_actual > 0
+    :return: DataFrame[reservation_id, date, action]
+    """
+    n_dates = df_booking["n_stay_actual"].to_numpy().astype(np.int64) + 1
+    starts = np.cumsum(n_dates) - n_dates
+
+    ## offset = position of the row in the exploded block of its reservation: 0, 1, ..., n_stay_actual
+    offsets = np.arange(n_dates.sum(), dtype=np.int64) - np.repeat(starts, n_dates)
+    n_dates_repeated = np.repeat(n_dates, n_dates)
+
+    dates = np.repeat(df_booking["arrival_date"].to_numpy(), n_dates) + offsets.astype("timedelta64[D]")
+    actions = np.where(offsets == 0, "arrival", np.where(offsets == n_dates_repeated - 1, "departure", "stay"))
+
+    return pd.DataFrame(
+        {
+            ## take() keeps Arrow-backed IDs in Arrow buffers (see hotels.load_data.arrow_types_mapper())
+            "reservation_id": df_booking["reservation_id"].array.take(np.repeat(np.arange(len(n_dates)), n_dates)),
+            "date": dates,
+            "action": actions.astype(object),
+        },
+        index=offsets,
+    )
+
+
+def split_into_partitions(df_booking: pd.DataFrame) -> dict[str, pd.DataFrame]:
+    """
+    Split reservations by hotel and arrival month.
+
+    :return: {"hotel=City Hotel/arrival_month=2015-07": DataFrame, ...} (hive-style partition paths)
+    """
+    arrival_month = df_booking["arrival_date"].dt.strftime("%Y-%m")
+    return {
+        f"hotel={hotel}/arrival_month={month}": df_part
+        for (hotel, month), df_part in df_booking.groupby(
+            [df_booking["hotel"], arrival_month], sort=True, observed=True
+        )
+    }
+
+
+def hash_partition(df_part: pd.DataFrame) -> str:
+    """Content hash of the columns of the reservations from which the actions are computed"""
+    row_hashes = pd.util.hash_pandas_object(df_part[_partition_source_cols], index=False)
+    return hashlib.md5(row_hashes.to_numpy().tobytes()).hexdigest()
+
+
+def read_manifest(output_dir: Path) -> dict[str, str]:
+    """
+    :return: mapping of partition path to its content hash. Empty if the layout of the existing table is outdated.
+    """
+    manifest_path = output_dir / ACTIONS_MANIFEST_NAME
+    if not manifest_path.exists():
+        return {}
+
+    manifest = json.loads(manifest_path.read_text())
+    if manifest.get("version") != ACTIONS_LAYOUT_VERSION:
+        return {}
+    return manifest["partitions"]
+
+
+def _write_action_partition(item: (Path, pd.DataFrame)):
+    """Compute the actions of the reservations of a partition and write them into the directory (in a worker)"""
+    partition_dir, df_part = item
+    partition_dir.mkdir(parents=True, exist_ok=True)
+    df_actions = reservations2actions(df_part).sort_values(by="date", kind="stable")
+    numpy_backed(df_actions).to_parquet(
+        partition_dir / "part-0.parquet", index=False, row_group_size=parquet_row_group_size
+    )
+
+
+def write_partitioned_actions(
+    df_booking: pd.DataFrame, output_dir: Path = actions_data_path, workers: Optional[int] = None
+):
+    """
+    Write the action table partitioned by hotel and arrival month. Partitions whose source reservations did not
+    change since the last run (same content hash) are kept as they are.
+
+    :param df_booking: reservations which are checked in and stayed at least one night
+    :param output_dir: directory of the partitioned parquet dataset
+    :param workers: number of worker processes building the changed partitions (see map_partitions())
+    """
+    old_hashes = read_manifest(output_dir)
+    if not old_hashes and output_dir.exists():
+        shutil.rmtree(output_dir)  ## outdated layout or unknown content
+
+    partitions = split_into_partitions(df_booking)
+    new_hashes = {path: hash_partition(df_part) for path, df_part in partitions.items()}
+
+    for path in set(old_hashes) - set(new_hashes):
+        shutil.rmtree(output_dir / path, ignore_errors=True)
+
+    changed_paths = [path for path, h in new_hashes.items() if old_hashes.get(path) != h]
+    map_partitions(
+        _write_action_partition, [(output_dir / path, partitions[path]) for path in changed_paths], workers=workers
+    )
+
+    output_dir.mkdir(parents=True, exist_ok=True)
+    manifest = {"version": ACTIONS_LAYOUT_VERSION, "partitions": new_hashes}
+    (output_dir / ACTIONS_MANIFEST_NAME).write_text(json.dumps(manifest, indent=2, sort_keys=True))
+    print(f"SAVED: {output_dir} ({len(changed_paths)}/{len(new_hashes)} partitions rebuilt)")
+
+
 def build_action_data():
     """
     Processing the cleaned data we create a table showing which guests arrive/stay/leave.
     """
     df_booking = load_booking_data()
-    df_actions = pd.concat(
-        df_booking.query("is_canceled == 0 and n_stay_actual > 0")
-        .progress_apply(_reservation2actions, axis=1)
-        .to_list(),
-        axis=0,
+    write_partitioned_actions(df_booking.query("is_canceled == 0 and n_stay_actual > 0"))
+
+
+def aggregate_daily_facts(df_booking: pd.DataFrame, df_actions: pd.DataFrame) -> pd.DataFrame:
+    """
+    Sum up the guests staying at night by day. The room of a guest is occupied on every date of the actions
+    except the departure date. The sales of a reservation are distributed evenly over the nights of the actual stay.
+
+    :return: DataFrame[hotel, date, room_type, country, market_segment, is_family,
+                       n_occupied_rooms, n_guests, required_car_parking_spaces, sales]
+    """
+    grain = ["hotel", "date", "room_type", "country", "market_segment", "is_family"]
+    measures = ["n_lodgers", "required_car_parking_spaces", "sales"]
+
+    df_booking_ext = df_booking.assign(
+        room_type=df_booking["assigned_room_type"],
+        is_family=df_booking["children"] + df_booking["babies"] > 0,
+        sales=df_booking["adr"] * df_booking["n_nights"] / df_booking["n_stay_actual"],
+    )[["reservation_id"] + [c for c in grain if c != "date"] + measures]
+
+    df_facts = (
+        df_actions.query("action != 'departure'")
+        .merge(df_booking_ext, on="reservation_id")
+        .groupby(grain, observed=True, dropna=False)
+        .agg(
+            n_occupied_rooms=("reservation_id", "size"),
+            n_guests=("n_lodgers", "sum"),
+            required_car_parking_spaces=("required_car_parking_spaces", "sum"),
+            sales=("sales", "sum"),
+        )
+        .reset_index()
+    )
+    return df_facts
+
+
+def build_daily_facts():
+    """
+    Gold layer for the dashboards: the daily facts of staying guests.
+    """
+    df_booking = load_booking_data()
+    df_actions = load_action_data()
+
+    df_facts = aggregate_daily_facts(df_booking, df_actions).sort_values(by=["hotel", "date"], kind="stable")
+    numpy_backed(df_facts).to_parquet(daily_facts_data_path, index=False, row_group_size=parquet_row_group_size)
+    print(f"SAVED: {daily_facts_data_path} ({len(df_facts)} rows)")
+
+
+def build_pms_snapshot():
+    """
+    Precompute the Hotel PMS page for all dates, so that the page only has to look up the selected date.
+    """
+    df_booking = load_booking_data()
+    tables = zip(
+        [pms_flows_data_path, pms_meals_data_path, pms_room_usage_data_path], aggregate_pms_snapshot(df_booking)
     )
-    df_actions.to_parquet(actions_data_path)
+
+    for path, df in tables:
+        numpy_backed(df).sort_values(by=["hotel", "date"], kind="stable").to_parquet(
+            path, index=False, row_group_size=parquet_row_group_size
+        )
+        print(f"SAVED: {path} ({len(df)} rows)")
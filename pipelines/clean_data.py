@@ -1,14 +1,45 @@
 """
 The purpose of this module is to make the raw data analysis-ready
+
+Environment variables:
+
+- HOTELS_STEP_METRICS: set "1" to measure each step of the cleaning and to write clean_data_metrics.json and
+  clean_data_steps.csv next to bookings.parquet (default: "0")
 """
-from typing import Optional
+from functools import partial
+from pathlib import Path
+from typing import Optional, Sequence
+import calendar
 import datetime as dt
+import json
+import os
+import shutil
+import time
+import tracemalloc
 
 import numpy as np
 import pandas as pd
 
-from hotels.load_data import load_raw_hotel_data, load_country_code_mapping, bookings_data_path, load_booking_data
+from hotels.load_data import (
+    load_raw_hotel_data,
+    load_country_code_mapping,
+    bookings_data_path,
+    load_booking_data,
+    load_property_registry,
+    numpy_backed,
+    booking_category_cols,
+    booking_int_dtypes,
+    booking_meal_cols,
+    booking_date_cols,
+    parquet_row_group_size,
+)
 from hotels.models import ReservationStatus
+from pipelines.parallel import map_partitions, n_workers
+
+step_metrics_enabled = os.environ.get("HOTELS_STEP_METRICS", "0") == "1"
+
+clean_data_metrics_path = bookings_data_path.parent / "clean_data_metrics.json"
+clean_data_steps_path = bookings_data_path.parent / "clean_data_steps.csv"
 
 
 def convert_country_4_human(data: pd.DataFrame):
@@ -17,7 +48,34 @@ def convert_country_4_human(data: pd.DataFrame):
     data["country"] = data["country"].apply(lambda x: code2country.get(x, x))
 
 
+def property_codes(s_hotel: pd.Series) -> dict[str, str]:
+    """
+    :param s_hotel: hotel column of the data
+    :return: mapping of hotel to its code in the property registry
+    """
+    hotel2code = {p.name: p.code for p in load_property_registry()}
+    unknown_hotels = sorted(set(s_hotel.unique()) - set(hotel2code))
+    if unknown_hotels:
+        raise ValueError(f"Unknown properties {unknown_hotels}. Add them to data/properties.csv")
+    return hotel2code
+
+
+_month_name2number = {name: number for number, name in enumerate(calendar.month_name) if name}
+
+
 def rows_to_date(data: pd.DataFrame) -> pd.Series:
+    return pd.to_datetime(
+        pd.DataFrame(
+            {
+                "year": data["arrival_date_year"],
+                "month": data["arrival_date_month"].map(_month_name2number),
+                "day": data["arrival_date_day_of_month"],
+            }
+        )
+    )
+
+
+def _rows_to_date_rowwise(data: pd.DataFrame) -> pd.Series:
     s_date_str = (
         data["arrival_date_day_of_month"].apply(lambda x: f"{x:02d}")
         + "/"
@@ -28,9 +86,106 @@ def rows_to_date(data: pd.DataFrame) -> pd.Series:
     return pd.to_datetime(s_date_str, format="%d/%B/%Y")
 
 
+def _measure_step(step: str, func, df: pd.DataFrame) -> dict:
+    """
+    Apply the in-place operator func to df and measure it. peak_memory_mb is the peak of the memory allocated during
+    the step on top of the memory at its start, traced by tracemalloc (as the benchmarks do) with the peak reset for
+    every step. The tracing slows the step down, so wall_time_sec is only comparable between measured runs.
+    """
+    columns_before = set(df.columns)
+    rows_in = len(df)
+    was_tracing = tracemalloc.is_tracing()
+    if not was_tracing:
+        tracemalloc.start()
+    tracemalloc.reset_peak()
+    memory_before, _ = tracemalloc.get_traced_memory()
+    start = time.perf_counter()
+
+    try:
+        func(df)
+        wall_time_sec = time.perf_counter() - start
+        _, peak_memory = tracemalloc.get_traced_memory()
+    finally:
+        if not was_tracing:
+            tracemalloc.stop()
+
+    return {
+        "step": step,
+        "wall_time_sec": wall_time_sec,
+        "peak_memory_mb": (peak_memory - memory_before) / 1024**2,
+        "rows_in": rows_in,
+        "rows_out": len(df),
+        "columns_added": [c for c in df.columns if c not in columns_before],
+    }
+
+
+def _merge_step_metrics(metrics_by_partition: list[list[dict]]) -> list[dict]:
+    """
+    Merge the measurements of the partitions step by step. wall_time_sec is the sum over the partitions (i.e. the
+    time spent by all workers) and peak_memory_mb is the maximum.
+    """
+    df_metrics = pd.DataFrame([metrics for metrics_list in metrics_by_partition for metrics in metrics_list])
+    return [
+        {
+            "step": step,
+            "wall_time_sec": df["wall_time_sec"].sum(),
+            "peak_memory_mb": df["peak_memory_mb"].max(),
+            "rows_in": int(df["rows_in"].sum()),
+            "rows_out": int(df["rows_out"].sum()),
+            "columns_added": df["columns_added"].iloc[0],
+        }
+        for step, df in df_metrics.groupby("step", sort=False)
+    ]
+
+
+def write_step_metrics(step_metrics: list[dict]):
+    """
+    Write the measurements of DataCleaner.apply_all() next to bookings.parquet.
+
+    - clean_data_metrics.json: DVC metrics file (numbers by step and in total)
+    - clean_data_steps.csv: DVC plots file (one row per step)
+    """
+    df_steps = pd.DataFrame(step_metrics).assign(
+        n_columns_added=lambda x: x["columns_added"].apply(len),
+        columns_added=lambda x: x["columns_added"].apply(" ".join),
+    )
+    df_steps.to_csv(clean_data_steps_path, index=False)
+
+    numeric_cols = ["wall_time_sec", "peak_memory_mb", "rows_in", "rows_out", "n_columns_added"]
+    metrics = df_steps.set_index("step")[numeric_cols].to_dict(orient="index")
+    metrics["total"] = {
+        "wall_time_sec": df_steps["wall_time_sec"].sum(),
+        ## the largest peak of a step (on top of the memory which the former steps kept)
+        "peak_memory_mb": df_steps["peak_memory_mb"].max(),
+        "rows_in": int(df_steps["rows_in"].iloc[0]),
+        "rows_out": int(df_steps["rows_out"].iloc[-1]),
+        "n_columns_added": int(df_steps["n_columns_added"].sum()),
+    }
+    clean_data_metrics_path.write_text(json.dumps(metrics, indent=2))
+    print(f"SAVED: {clean_data_metrics_path}, {clean_data_steps_path}")
+
+
 class DataCleaner:
     """all methods are static methods which manipulate dataframes in place except apply_all()"""
 
+    ## steps of apply_all() in the order of execution
+    steps = (
+        "convert_data_type",
+        "remove_invalid_records",
+        "add_arrival_date",
+        "add_reservation_date",
+        "add_is_last_minute_cancellation",
+        "add_actual_departure_date",
+        "add_meals",
+        "append_reservation_id",
+        "compact_dtypes",
+    )
+
+    ## steps which need all rows: the serial numbers of reservation_id and the categories. They must be the last steps.
+    global_steps = ("append_reservation_id", "compact_dtypes")
+    ## partition key of the parallel execution (columns of the raw data)
+    partition_cols = ["hotel", "arrival_date_year", "arrival_date_month"]
+
     @staticmethod
     def convert_data_type(df: pd.DataFrame):
         df["reservation_status_date"] = pd.to_datetime(df["reservation_status_date"])
@@ -58,7 +213,7 @@ class DataCleaner:
         """
         df["arrival_date"] = rows_to_date(df)
         df["n_nights"] = df["stays_in_week_nights"] + df["stays_in_weekend_nights"]
-        df["departure_date"] = df["arrival_date"] + df["n_nights"].apply(pd.Timedelta, unit="D")
+        df["departure_date"] = df["arrival_date"] + pd.to_timedelta(df["n_nights"], unit="D")
         df["total_transaction"] = df["n_nights"] * df["adr"]
 
         old_arrival_date_cols = [c for c in df.columns if c.startswith("arrival_date_")]
@@ -69,7 +224,7 @@ class DataCleaner:
         """
         Add dates of booking.
         """
-        df["reservation_date"] = df["arrival_date"] - df["lead_time"].apply(dt.timedelta)
+        df["reservation_date"] = df["arrival_date"] - pd.to_timedelta(df["lead_time"], unit="D")
 
     @staticmethod
     def add_is_last_minute_cancellation(df: pd.DataFrame):
@@ -94,14 +249,9 @@ class DataCleaner:
         - Add a boolean column is_early_departure.
         """
 
-        def actual_departure_date(row) -> Optional[pd.Timestamp]:
-            if row["reservation_status"] == ReservationStatus.check_out.value:
-                return row["reservation_status_date"]
-            else:
-                return None
-
-        df["actual_departure_date"] = df.apply(actual_departure_date, axis=1)
-        df["n_stay_actual"] = (df["actual_departure_date"] - df["arrival_date"]).apply(lambda x: x.days)
+        is_check_out = df["reservation_status"] == ReservationStatus.check_out.value
+        df["actual_departure_date"] = df["reservation_status_date"].where(is_check_out)
+        df["n_stay_actual"] = (df["actual_departure_date"] - df["arrival_date"]).dt.days
         df["is_early_departure"] = df["actual_departure_date"] < df["departure_date"]
 
     @staticmethod
@@ -132,33 +282,161 @@ class DataCleaner:
     @staticmethod
     def append_reservation_id(df: pd.DataFrame):
         """
-        Append a unique ID for each reservation
+        Append a unique ID for each reservation: the code of the property and a serial number
         """
-        s_number = pd.Series(np.arange(len(df)) + 1, index=df.index).apply(lambda v: f"{v:06d}")
-        df["reservation_id"] = df["hotel"].apply(lambda s: s[0]) + s_number
+        s_number = pd.Series(np.char.zfill((np.arange(len(df)) + 1).astype(str), 6), index=df.index).astype(object)
+        df["reservation_id"] = df["hotel"].map(property_codes(df["hotel"])) + s_number
+
+    @staticmethod
+    def compact_dtypes(df: pd.DataFrame):
+        """
+        Shrink the memory footprint of the data:
+
+        - Low-cardinality strings become categorical.
+        - Small counts are downcast to int8/int16. A value out of the range of the dtype raises a ValueError instead
+          of wrapping around.
+        - Meals become boolean. (A missing value comes from "Undefined" which is regarded as SC.)
+        - Dates are stored in seconds.
+        """
+        for col in booking_meal_cols:
+            df[col] = df[col].eq(True)
+
+        for col, dtype in booking_int_dtypes.items():
+            info = np.iinfo(dtype)
+            low, high = df[col].min(), df[col].max()
+            if low < info.min or high > info.max:
+                raise ValueError(f"{col} ranges from {low} to {high}, which does not fit into {dtype}")
+
+        dtypes = {c: "category" for c in booking_category_cols}
+        dtypes.update(booking_int_dtypes)
+        dtypes.update({c: "datetime64[s]" for c in booking_date_cols})
+
+        for col, dtype in dtypes.items():
+            df[col] = df[col].astype(dtype)
 
     @classmethod
-    def apply_all(cls, data_raw: pd.DataFrame):
-        df = data_raw.copy()
-
-        cls.convert_data_type(df)
-        cls.remove_invalid_records(df)
-        cls.add_arrival_date(df)
-        cls.add_reservation_date(df)
-        cls.add_is_last_minute_cancellation(df)
-        cls.add_actual_departure_date(df)
-        cls.add_meals(df)
-        cls.append_reservation_id(df)
+    def _apply_steps(cls, df: pd.DataFrame, steps: Sequence[str], step_metrics: Optional[list[dict]] = None):
+        """in-place operator"""
+        for step in steps:
+            if step_metrics is None:
+                getattr(cls, step)(df)
+            else:
+                step_metrics.append(_measure_step(step, getattr(cls, step), df))
 
+    @classmethod
+    def _apply_partition_steps(cls, df: pd.DataFrame, measure: bool = False) -> (pd.DataFrame, list[dict]):
+        """Apply the steps except global_steps to a partition (in a worker process)"""
+        step_metrics = [] if measure else None
+        cls._apply_steps(df, [step for step in cls.steps if step not in cls.global_steps], step_metrics)
+        return df, step_metrics
+
+    @classmethod
+    def apply_all(
+        cls, data_raw: pd.DataFrame, step_metrics: Optional[list[dict]] = None, workers: Optional[int] = None
+    ):
+        """
+        :param data_raw: raw data. This is not modified.
+        :param step_metrics: If a list is given, a record of measurements is appended to it for each step:
+          step, wall_time_sec, peak_memory_mb, rows_in, rows_out, columns_added (see _measure_step())
+        :param workers: number of worker processes (HOTELS_WORKERS by default). If it is more than 1, the steps
+          except global_steps are applied to the partitions (hotel and arrival month) in parallel. The partitions are
+          merged in the original row order before global_steps, so that the result is the same as the serial one.
+        """
+        workers = n_workers if workers is None else workers
+        if workers <= 1:
+            df = data_raw.copy()
+            cls._apply_steps(df, cls.steps, step_metrics)
+            return df
+
+        df_raw = data_raw.reset_index(drop=True)
+        partitions = [df for _, df in df_raw.groupby(cls.partition_cols, sort=False, dropna=False)]
+        apply_partition_steps = partial(cls._apply_partition_steps, measure=step_metrics is not None)
+        results = map_partitions(apply_partition_steps, partitions, workers=workers)
+
+        df = pd.concat([df for df, _ in results]).sort_index(kind="stable")
+        df.index = data_raw.index[df.index]
+        if step_metrics is not None:
+            step_metrics.extend(_merge_step_metrics([metrics for _, metrics in results]))
+
+        cls._apply_steps(df, cls.global_steps, step_metrics)
         return df
 
 
+class RowwiseDataCleaner(DataCleaner):
+    """
+    The original row-by-row implementations of the steps which DataCleaner computes in a vectorized way.
+    This class is kept as the reference: RowwiseDataCleaner.apply_all() and DataCleaner.apply_all() must agree.
+    """
+
+    @staticmethod
+    def add_arrival_date(df: pd.DataFrame):
+        df["arrival_date"] = _rows_to_date_rowwise(df)
+        df["n_nights"] = df["stays_in_week_nights"] + df["stays_in_weekend_nights"]
+        df["departure_date"] = df["arrival_date"] + df["n_nights"].apply(pd.Timedelta, unit="D")
+        df["total_transaction"] = df["n_nights"] * df["adr"]
+
+        old_arrival_date_cols = [c for c in df.columns if c.startswith("arrival_date_")]
+        df.drop(columns=old_arrival_date_cols, inplace=True)
+
+    @staticmethod
+    def add_reservation_date(df: pd.DataFrame):
+        df["reservation_date"] = df["arrival_date"] - df["lead_time"].apply(dt.timedelta)
+
+    @staticmethod
+    def add_actual_departure_date(df: pd.DataFrame):
+        def actual_departure_date(row) -> Optional[pd.Timestamp]:
+            if row["reservation_status"] == ReservationStatus.check_out.value:
+                return row["reservation_status_date"]
+            else:
+                return None
+
+        df["actual_departure_date"] = df.apply(actual_departure_date, axis=1)
+        df["n_stay_actual"] = (df["actual_departure_date"] - df["arrival_date"]).apply(lambda x: x.days)
+        df["is_early_departure"] = df["actual_departure_date"] < df["departure_date"]
+
+    @staticmethod
+    def append_reservation_id(df: pd.DataFrame):
+        hotel2code = property_codes(df["hotel"])
+        s_number = pd.Series(np.arange(len(df)) + 1, index=df.index).apply(lambda v: f"{v:06d}")
+        df["reservation_id"] = df["hotel"].apply(lambda s: hotel2code[s]) + s_number
+
+
+def write_partitioned_bookings(df_booking: pd.DataFrame, output_dir: Path = bookings_data_path):
+    """
+    Write the bookings partitioned by hotel (hive-style: hotel=City Hotel/part-0.parquet), so that a reader of a
+    single hotel reads only its partition. The rows of a partition are sorted by arrival date.
+    """
+    if output_dir.is_dir():
+        shutil.rmtree(output_dir)
+    elif output_dir.exists():
+        output_dir.unlink()  ## single file of the old layout
+
+    for hotel, df_part in numpy_backed(df_booking).groupby("hotel", observed=True):
+        partition_dir = output_dir / f"hotel={hotel}"
+        partition_dir.mkdir(parents=True)
+        df_part.drop(columns="hotel").sort_values(by="arrival_date", kind="stable").to_parquet(
+            partition_dir / "part-0.parquet", row_group_size=parquet_row_group_size
+        )
+
+
+def as_partitioned_bookings(df_booking: pd.DataFrame) -> pd.DataFrame:
+    """
+    The bookings as load_booking_data() reads them after write_partitioned_bookings(): ordered by hotel and arrival
+    date (stable), with hotel as the last column. The next stage can use them without reading the files again.
+    """
+    df = df_booking.sort_values(by=["hotel", "arrival_date"], kind="stable")
+    return df[[c for c in df.columns if c != "hotel"] + ["hotel"]]
+
+
 def main():
     df_hotel_raw = load_raw_hotel_data()
-    df_hotel_cleaned = DataCleaner.apply_all(df_hotel_raw)
+    step_metrics = [] if step_metrics_enabled else None
+    df_hotel_cleaned = DataCleaner.apply_all(df_hotel_raw, step_metrics=step_metrics)
 
-    df_hotel_cleaned.to_parquet(bookings_data_path)
+    write_partitioned_bookings(df_hotel_cleaned)
     print(f"SAVED: {bookings_data_path} ({len(df_hotel_cleaned)} rows)")
+    if step_metrics is not None:
+        write_step_metrics(step_metrics)
 
 
 def data_testing():
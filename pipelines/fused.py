@@ -0,0 +1,64 @@
+"""
+The purpose of this module is to run the stages retrieve_data, clean_data and action_data in one process
+
+Each stage passes its result to the next one in memory instead of the next stage reading the parquet files back
+(through DVC). The output files are the same as those of the separate stages, so that the DVC pipeline can continue
+from them:
+
+    poetry run fused_pipeline
+    poetry run dvc commit retrieve_data clean_data action_data
+    poetry run dvc repro
+
+(With raw_data.source: synthetic, commit data/raw/synthetic/dvc.yaml:synthetic_data instead of retrieve_data.)
+"""
+import time
+from typing import Optional
+
+import pandas as pd
+import pyarrow as pa
+
+from hotels.load_data import bookings_data_path, table_to_pandas
+from pipelines.aggregate_data import write_partitioned_actions
+from pipelines.clean_data import (
+    DataCleaner,
+    as_partitioned_bookings,
+    step_metrics_enabled,
+    write_partitioned_bookings,
+    write_step_metrics,
+)
+from pipelines.retrieve_data import retrieve_raw_data
+
+
+def run_fused_pipeline(workers: Optional[int] = None) -> pd.DataFrame:
+    """
+    :param workers: number of worker processes of the cleaning and the action table (see map_partitions())
+    :return: the cleaned bookings as load_booking_data() returns them
+    """
+    start = time.perf_counter()
+    tables = []
+    retrieve_raw_data(tables=tables)
+    ## the same DataFrame as load_raw_hotel_data() reads from the written file
+    df_hotel_raw = table_to_pandas(pa.concat_tables(tables))
+    del tables
+
+    step_metrics = [] if step_metrics_enabled else None
+    df_hotel_cleaned = DataCleaner.apply_all(df_hotel_raw, step_metrics=step_metrics, workers=workers)
+    del df_hotel_raw
+    write_partitioned_bookings(df_hotel_cleaned)
+    print(f"SAVED: {bookings_data_path} ({len(df_hotel_cleaned)} rows)")
+    if step_metrics is not None:
+        write_step_metrics(step_metrics)
+
+    df_booking = as_partitioned_bookings(df_hotel_cleaned)
+    write_partitioned_actions(df_booking.query("is_canceled == 0 and n_stay_actual > 0"), workers=workers)
+
+    print(f"FINISHED: retrieve_data, clean_data and action_data in {time.perf_counter() - start:0.1f} s")
+    return df_booking
+
+
+def main():
+    run_fused_pipeline()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,31 @@
+"""
+The purpose of this module is to run a stage of the data pipeline on partitions of the data in worker processes
+
+Environment variables:
+
+- HOTELS_WORKERS: number of worker processes (default: 1, i.e. the partitions are processed in this process)
+"""
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Optional, Sequence, TypeVar
+import os
+
+P = TypeVar("P")
+R = TypeVar("R")
+
+n_workers = int(os.environ.get("HOTELS_WORKERS", "1"))
+
+
+def map_partitions(func: Callable[[P], R], partitions: Sequence[P], workers: Optional[int] = None) -> list[R]:
+    """
+    Apply func to every partition. The results are in the order of the partitions for any number of workers, so
+    that merging them is deterministic.
+
+    :param func: function defined at module level (it is pickled to the worker processes)
+    :param workers: number of worker processes. HOTELS_WORKERS by default. No process is started if it is 1.
+    """
+    workers = n_workers if workers is None else workers
+    if workers <= 1 or len(partitions) <= 1:
+        return [func(partition) for partition in partitions]
+
+    with ProcessPoolExecutor(max_workers=min(workers, len(partitions))) as executor:
+        return list(executor.map(func, partitions))
@@ -1,21 +1,116 @@
 """
 The purpose of this module is to provide functions to download the raw data
+
+The source and the URL of the raw data are the parameters raw_data.source and raw_data.url in params.yaml.
+
+Environment variables:
+
+- HOTELS_RAW_CHUNK_SIZE: number of rows read and written at once (default: 100000). The peak memory of the
+  ingestion is bounded by the chunk size, not by the size of the file.
 """
+from pathlib import Path
+from typing import Optional
+import json
+import os
+import tempfile
+import time
+
+import fsspec
 import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from hotels.load_data import hotel_raw_data_path, load_pipeline_params, synthetic_profile_path
+from hotels.models import RawDataSource
+from pipelines.synthetic import fit_profile, raw_schema, write_synthetic_raw_data
+
+raw_source = RawDataSource(load_pipeline_params()["raw_data"]["source"])
+raw_url = load_pipeline_params()["raw_data"]["url"]
+raw_chunk_size = int(os.environ.get("HOTELS_RAW_CHUNK_SIZE", "100000"))
+
+
+def raw_dtypes() -> dict:
+    """dtypes of the columns of hotels.csv for pd.read_csv() by raw_schema, so that no dtype is inferred"""
+    return {f.name: object if pa.types.is_string(f.type) else f.type.to_pandas_dtype() for f in raw_schema}
+
+
+def stream_raw_data(
+    source: str = raw_url,
+    output_path: Path = hotel_raw_data_path,
+    chunk_size: int = raw_chunk_size,
+    tables: Optional[list[pa.Table]] = None,
+):
+    """
+    Read the CSV file chunk by chunk and append every chunk to hotels.parquet as a row group.
+
+    The file is read as a stream through fsspec (local path, http(s)://, s3://, ...), so at most one chunk is held in
+    memory. A column which does not match raw_schema (e.g. a text in an integer column) raises a ValueError, and the
+    existing hotels.parquet is kept.
+
+    :param source: URL or path of the CSV file
+    :param chunk_size: number of rows of a chunk (and of a row group of the parquet file)
+    :param tables: if given, the chunks are also appended to it as Arrow tables (see pipelines/fused.py)
+    :return: {"rows", "chunks", "bytes" (of the CSV file), "seconds"}
+    """
+    start = time.perf_counter()
+    n_rows, n_chunks = 0, 0
+    ## the file is written under a temporary name and replaces output_path only if every chunk is valid
+    fd, tmp_name = tempfile.mkstemp(dir=output_path.parent, prefix=f".{output_path.name}.", suffix=".tmp")
+    os.close(fd)
+    try:
+        with fsspec.open(source, "rb", compression="infer") as f, pq.ParquetWriter(tmp_name, raw_schema) as writer:
+            for df in pd.read_csv(f, usecols=raw_schema.names, dtype=raw_dtypes(), chunksize=chunk_size):
+                table = pa.Table.from_pandas(df[raw_schema.names], schema=raw_schema, preserve_index=False)
+                writer.write_table(table, row_group_size=chunk_size)
+                if tables is not None:
+                    tables.append(table)
+                n_rows += len(df)
+                n_chunks += 1
+            n_bytes = f.tell()
+        os.replace(tmp_name, output_path)
+    finally:
+        if os.path.exists(tmp_name):
+            os.remove(tmp_name)
+    return {"rows": n_rows, "chunks": n_chunks, "bytes": n_bytes, "seconds": time.perf_counter() - start}
+
+
+def download_raw_data(tables: Optional[list[pa.Table]] = None):
+    stats = stream_raw_data(tables=tables)
+    seconds = max(stats["seconds"], 1e-9)
+    print(
+        f"DOWNLOADED: {hotel_raw_data_path} ({stats['rows']} rows in {stats['chunks']} chunks, {seconds:0.1f} s, "
+        f"{stats['rows'] / seconds:0.0f} rows/s, {stats['bytes'] / 1024**2 / seconds:0.1f} MiB/s)"
+    )
+
+
+def build_synthetic_profile():
+    """
+    Fit the profile of the synthetic data to the retrieved raw data of raw_data.url, so that the CSV file is not
+    downloaded again
+    """
+    synthetic_profile_path.write_text(json.dumps(fit_profile(pd.read_parquet(hotel_raw_data_path))))
+    print(f"SAVED: {synthetic_profile_path}")
+
 
-from hotels.load_data import hotel_raw_data_path
+def build_synthetic_data():
+    write_synthetic_raw_data()
 
-DATA_URL = "https://raw.githubusercontent.com/rfordatascience/tidytuesday/master/data/2020/2020-02-11/hotels.csv"
 
+def retrieve_raw_data(tables: Optional[list[pa.Table]] = None):
+    """
+    Write the raw data of raw_data.source: hotels.parquet of raw_data.url, or the synthetic data generated from the
+    existing profile (see data/raw/synthetic/dvc.yaml).
 
-def download_raw_data():
-    df = pd.read_csv(DATA_URL)
-    df.to_parquet(hotel_raw_data_path)
-    print(f"DOWNLOADED: {hotel_raw_data_path}")
+    :param tables: if given, the written data is also appended to it as Arrow tables
+    """
+    if raw_source == RawDataSource.synthetic:
+        write_synthetic_raw_data(tables=tables)
+    else:
+        download_raw_data(tables=tables)
 
 
 def main():
-    download_raw_data()
+    retrieve_raw_data()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,339 @@
+"""
+The purpose of this module is to generate raw data for load testing
+
+A profile of the original data (hotels.csv) is fitted once and kept as a JSON file. The profile consists of the
+marginal distributions of each hotel, partly conditioned on the market segment (lead time, cancellation rate,
+distribution channel) and on the arrival month (adr). Raw data with the schema of hotels.parquet is generated from
+the profile without network access, at any scale and for any number of properties.
+
+The stages synthetic_profile and synthetic_data are in data/raw/synthetic/dvc.yaml. They are reproduced with
+raw_data.source: synthetic in params.yaml. The parameters of the generated data are under synthetic in params.yaml:
+
+- scale: number of rows relative to the original data
+- properties: number of properties (null: all properties of the registry)
+- seed: seed of the random numbers
+"""
+from pathlib import Path
+from typing import Iterator, Optional
+import calendar
+import json
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from hotels.load_data import (
+    load_pipeline_params,
+    load_property_registry,
+    synthetic_profile_path,
+    synthetic_raw_data_path,
+)
+from pipelines.clean_data import rows_to_date
+
+synthetic_params = load_pipeline_params()["synthetic"]
+synthetic_scale = float(synthetic_params["scale"])
+synthetic_n_properties = synthetic_params["properties"]
+synthetic_seed = int(synthetic_params["seed"])
+
+PROFILE_VERSION = 1
+
+## schema of hotels.parquet (the columns of hotels.csv in the original order)
+raw_schema = pa.schema(
+    [
+        ("hotel", pa.string()),
+        ("is_canceled", pa.int64()),
+        ("lead_time", pa.int64()),
+        ("arrival_date_year", pa.int64()),
+        ("arrival_date_month", pa.string()),
+        ("arrival_date_week_number", pa.int64()),
+        ("arrival_date_day_of_month", pa.int64()),
+        ("stays_in_weekend_nights", pa.int64()),
+        ("stays_in_week_nights", pa.int64()),
+        ("adults", pa.int64()),
+        ("children", pa.float64()),
+        ("babies", pa.int64()),
+        ("meal", pa.string()),
+        ("country", pa.string()),
+        ("market_segment", pa.string()),
+        ("distribution_channel", pa.string()),
+        ("is_repeated_guest", pa.int64()),
+        ("previous_cancellations", pa.int64()),
+        ("previous_bookings_not_canceled", pa.int64()),
+        ("reserved_room_type", pa.string()),
+        ("assigned_room_type", pa.string()),
+        ("booking_changes", pa.int64()),
+        ("deposit_type", pa.string()),
+        ("agent", pa.float64()),
+        ("company", pa.float64()),
+        ("days_in_waiting_list", pa.int64()),
+        ("customer_type", pa.string()),
+        ("adr", pa.float64()),
+        ("required_car_parking_spaces", pa.int64()),
+        ("total_of_special_requests", pa.int64()),
+        ("reservation_status", pa.string()),
+        ("reservation_status_date", pa.string()),
+    ]
+)
+
+## columns which are drawn independently from their marginal distributions
+_marginal_cols = [
+    "meal",
+    "country",
+    "customer_type",
+    "deposit_type",
+    "is_repeated_guest",
+    "previous_cancellations",
+    "previous_bookings_not_canceled",
+    "booking_changes",
+    "agent",
+    "company",
+    "days_in_waiting_list",
+    "required_car_parking_spaces",
+    "total_of_special_requests",
+]
+
+_month_names = np.array(calendar.month_name, dtype=object)
+
+## probabilities of the quantiles in the profile
+_quantile_probs = np.linspace(0, 1, 101)
+
+
+def _fit_categorical(s: pd.Series) -> dict:
+    """:return: {"values": [...], "p": [...]}. A missing value is None."""
+    s_p = s.value_counts(normalize=True, dropna=False)
+    values = [None if pd.isna(v) else (v.item() if isinstance(v, np.generic) else v) for v in s_p.index]
+    return {"values": values, "p": s_p.to_list()}
+
+
+def _fit_quantiles(s: pd.Series) -> list[float]:
+    return np.quantile(s.to_numpy(dtype=np.float64), _quantile_probs).tolist() if len(s) else [0.0]
+
+
+def _fit_hotel(df: pd.DataFrame) -> dict:
+    arrival_date = rows_to_date(df)
+    status_date = pd.to_datetime(df["reservation_status_date"])
+    n_nights = df["stays_in_weekend_nights"] + df["stays_in_week_nights"]
+    party = df["adults"].astype(str) + "," + df["children"].astype(str) + "," + df["babies"].astype(str)
+
+    is_canceled = df["is_canceled"] == 1
+    is_no_show = df["reservation_status"] == "No-Show"
+    ## when a reservation is cancelled, relative to its lead time (0: on the arrival date, 1: on the reservation date)
+    cancel_timing = ((arrival_date - status_date).dt.days / df["lead_time"]).where(
+        (df["reservation_status"] == "Canceled") & (df["lead_time"] > 0)
+    )
+
+    segments = {}
+    for segment, df_segment in df.groupby("market_segment"):
+        segments[segment] = {
+            "cancellation_rate": float(df_segment["is_canceled"].mean()),
+            "lead_time_quantiles": _fit_quantiles(df_segment["lead_time"]),
+            "distribution_channel": _fit_categorical(df_segment["distribution_channel"]),
+        }
+
+    adr_quantiles_by_month = {
+        int(month): _fit_quantiles(s_adr) for month, s_adr in df["adr"].groupby(arrival_date.dt.month)
+    }
+
+    is_same_room = df["reserved_room_type"] == df["assigned_room_type"]
+    return {
+        "n_rows": len(df),
+        "arrival_date": _fit_categorical(arrival_date.dt.strftime("%Y-%m-%d")),
+        "market_segment": _fit_categorical(df["market_segment"]),
+        "segments": segments,
+        "no_show_rate": float(is_no_show[is_canceled].mean()) if is_canceled.any() else 0.0,
+        "cancel_timing_quantiles": _fit_quantiles(cancel_timing.dropna().clip(0, 1)),
+        "n_nights": _fit_categorical(n_nights),
+        "party": _fit_categorical(party),
+        "reserved_room_type": _fit_categorical(df["reserved_room_type"]),
+        "same_room_rate": float(is_same_room.mean()),
+        "assigned_room_type": _fit_categorical(df.loc[~is_same_room, "assigned_room_type"]),
+        "adr_quantiles_by_month": adr_quantiles_by_month,
+        "adr_quantiles": _fit_quantiles(df["adr"]),
+        "marginals": {col: _fit_categorical(df[col]) for col in _marginal_cols},
+    }
+
+
+def fit_profile(data_raw: pd.DataFrame) -> dict:
+    """
+    :param data_raw: raw data (the schema of hotels.parquet)
+    :return: profile of each hotel (JSON-serializable)
+    """
+    return {
+        "version": PROFILE_VERSION,
+        "hotels": {hotel: _fit_hotel(df) for hotel, df in data_raw.groupby("hotel")},
+    }
+
+
+def _sample_index(rng: np.random.Generator, dist: dict, size: int) -> np.ndarray:
+    """:return: positions of the sampled values in dist["values"]"""
+    p = np.asarray(dist["p"], dtype=np.float64)
+    return rng.choice(len(p), size=size, p=p / p.sum())
+
+
+def _sample_categorical(rng: np.random.Generator, dist: dict, size: int) -> np.ndarray:
+    values = np.array(dist["values"], dtype=object)
+    if len(values) == 0:
+        return np.full(size, None, dtype=object)
+    return values[_sample_index(rng, dist, size)]
+
+
+def _sample_quantiles(rng: np.random.Generator, quantiles: list[float], size: int) -> np.ndarray:
+    """inverse transform sampling with the linear interpolation of the quantiles"""
+    return np.interp(rng.random(size), np.linspace(0, 1, len(quantiles)), quantiles)
+
+
+def _count_weekend_nights(arrival_date: pd.DatetimeIndex, n_nights: np.ndarray) -> np.ndarray:
+    """number of the nights of Saturday and Sunday from the arrival date"""
+    ## is_weekend_cumsum[w, r]: number of the weekend nights in the first r nights starting on weekday w
+    is_weekend = np.array([0, 0, 0, 0, 0, 1, 1] * 2)
+    is_weekend_cumsum = np.stack([np.concatenate([[0], np.cumsum(is_weekend[w : w + 7])]) for w in range(7)])
+    return 2 * (n_nights // 7) + is_weekend_cumsum[arrival_date.weekday, n_nights % 7]
+
+
+def _to_number(values: np.ndarray, dtype) -> np.ndarray:
+    return pd.Series(values, dtype=object).astype(np.float64).to_numpy().astype(dtype)
+
+
+def generate_hotel(profile: dict, hotel: str, size: int, rng: np.random.Generator) -> pd.DataFrame:
+    """
+    :param profile: profile of a hotel (see fit_profile())
+    :param hotel: name of the generated hotel
+    :param size: number of rows
+    :return: raw data of the hotel (the schema of hotels.parquet)
+    """
+    arrival_date = pd.DatetimeIndex(_sample_categorical(rng, profile["arrival_date"], size).astype("datetime64[D]"))
+    market_segment = _sample_categorical(rng, profile["market_segment"], size)
+
+    lead_time = np.zeros(size, dtype=np.int64)
+    is_canceled = np.zeros(size, dtype=np.int64)
+    distribution_channel = np.empty(size, dtype=object)
+    for segment, segment_profile in profile["segments"].items():
+        is_segment = market_segment == segment
+        n = int(is_segment.sum())
+        lead_time[is_segment] = np.rint(_sample_quantiles(rng, segment_profile["lead_time_quantiles"], n))
+        is_canceled[is_segment] = rng.random(n) < segment_profile["cancellation_rate"]
+        distribution_channel[is_segment] = _sample_categorical(rng, segment_profile["distribution_channel"], n)
+
+    n_nights = _to_number(_sample_categorical(rng, profile["n_nights"], size), np.int64)
+    n_weekend_nights = _count_weekend_nights(arrival_date, n_nights)
+    ## adults, children, babies
+    parties = np.array([[float(v) for v in party.split(",")] for party in profile["party"]["values"]])
+    party = parties[_sample_index(rng, profile["party"], size)]
+
+    reserved_room_type = _sample_categorical(rng, profile["reserved_room_type"], size)
+    assigned_room_type = np.where(
+        rng.random(size) < profile["same_room_rate"],
+        reserved_room_type,
+        _sample_categorical(rng, profile["assigned_room_type"], size),
+    )
+    assigned_room_type = np.where(pd.isna(assigned_room_type), reserved_room_type, assigned_room_type)
+
+    ## adr by the arrival month (seasonality)
+    adr = _sample_quantiles(rng, profile["adr_quantiles"], size)
+    for month, quantiles in profile["adr_quantiles_by_month"].items():
+        is_month = arrival_date.month == int(month)
+        adr[is_month] = _sample_quantiles(rng, quantiles, int(is_month.sum()))
+
+    ## the status follows from the cancellation: check-out on the departure date, no-show on the arrival date or
+    ## cancellation between the reservation date and the arrival date
+    is_no_show = (is_canceled == 1) & (rng.random(size) < profile["no_show_rate"])
+    cancel_timing = _sample_quantiles(rng, profile["cancel_timing_quantiles"], size)
+    reservation_status = np.select([is_canceled == 0, is_no_show], ["Check-Out", "No-Show"], "Canceled")
+    days_from_arrival = np.select(
+        [is_canceled == 0, is_no_show], [n_nights, 0], -np.rint(cancel_timing * lead_time).astype(np.int64)
+    )
+    reservation_status_date = arrival_date + pd.to_timedelta(days_from_arrival, unit="D")
+
+    df = pd.DataFrame(
+        {
+            "hotel": hotel,
+            "is_canceled": is_canceled,
+            "lead_time": lead_time,
+            "arrival_date_year": arrival_date.year.astype(np.int64),
+            "arrival_date_month": _month_names[arrival_date.month],
+            "arrival_date_week_number": arrival_date.isocalendar().week.to_numpy().astype(np.int64),
+            "arrival_date_day_of_month": arrival_date.day.astype(np.int64),
+            "stays_in_weekend_nights": n_weekend_nights,
+            "stays_in_week_nights": n_nights - n_weekend_nights,
+            "adults": party[:, 0].astype(np.int64),
+            "children": party[:, 1],
+            "babies": party[:, 2].astype(np.int64),
+            "market_segment": market_segment,
+            "distribution_channel": distribution_channel,
+            "reserved_room_type": reserved_room_type,
+            "assigned_room_type": assigned_room_type,
+            "adr": np.round(adr, 2),
+            "reservation_status": reservation_status,
+            "reservation_status_date": reservation_status_date.strftime("%Y-%m-%d"),
+        }
+    )
+    for col, dist in profile["marginals"].items():
+        values = _sample_categorical(rng, dist, size)
+        df[col] = values if pa.types.is_string(raw_schema.field(col).type) else _to_number(values, np.float64)
+
+    return df.astype({f.name: "int64" for f in raw_schema if pa.types.is_integer(f.type)})[raw_schema.names]
+
+
+def generate_raw_data(
+    profile: dict,
+    scale: float,
+    properties: list[str],
+    seed: int = 0,
+    chunk_size: int = 1_000_000,
+) -> Iterator[pd.DataFrame]:
+    """
+    Generate the raw data chunk by chunk. The result depends only on the arguments.
+
+    Property i is modeled after the hotel in the profile with the same name, otherwise after the i-th hotel of the
+    profile (cyclically). Each property has round(scale * number of rows of its model) rows.
+
+    :param profile: see fit_profile()
+    :param scale: number of rows relative to the data which the profile is fitted to
+    :param properties: names of the properties to generate
+    :param seed: seed of the random numbers
+    :param chunk_size: maximum number of rows of a chunk
+    """
+    model_hotels = list(profile["hotels"])
+    for i, hotel in enumerate(properties):
+        model = profile["hotels"][hotel if hotel in profile["hotels"] else model_hotels[i % len(model_hotels)]]
+        n_rows = int(round(scale * model["n_rows"]))
+
+        for j, start in enumerate(range(0, n_rows, chunk_size)):
+            rng = np.random.default_rng([seed, i, j])
+            yield generate_hotel(model, hotel, min(chunk_size, n_rows - start), rng)
+
+
+def write_synthetic_raw_data(
+    output_path: Path = synthetic_raw_data_path,
+    scale: float = synthetic_scale,
+    n_properties: Optional[int] = None,
+    seed: int = synthetic_seed,
+    tables: Optional[list[pa.Table]] = None,
+):
+    """
+    Generate the raw data from the profile and write it chunk by chunk into data/raw/synthetic/hotels.parquet.
+
+    :param n_properties: number of properties. They are taken from the registry in order. All by default.
+    :param tables: if given, the chunks are also appended to it as Arrow tables (see pipelines/fused.py)
+    """
+    profile = json.loads(synthetic_profile_path.read_text())
+    if profile.get("version") != PROFILE_VERSION:
+        raise ValueError(f"Outdated profile {synthetic_profile_path}. Run `poetry run synthetic_profile` again.")
+
+    properties = [p.name for p in load_property_registry()]
+    if n_properties is None and synthetic_n_properties is not None:
+        n_properties = int(synthetic_n_properties)
+    if n_properties is not None and n_properties > len(properties):
+        raise ValueError(f"Only {len(properties)} properties are registered. Add more to data/properties.csv")
+    properties = properties[:n_properties]
+
+    n_rows = 0
+    with pq.ParquetWriter(output_path, raw_schema) as writer:
+        for df in generate_raw_data(profile, scale, properties, seed=seed):
+            table = pa.Table.from_pandas(df, schema=raw_schema, preserve_index=False)
+            writer.write_table(table)
+            if tables is not None:
+                tables.append(table)
+            n_rows += len(df)
+    print(f"GENERATED: {output_path} ({n_rows} rows, {len(properties)} properties, seed {seed})")
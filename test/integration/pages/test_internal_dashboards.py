@@ -5,3 +5,6 @@ def test_hotel_pms_dashboard():
     at = AppTest.from_file("pages/2_📊_Internal_Dashboards.py", default_timeout=15)
     at.run()
     assert len(at.exception) == 0
+    ## the page is not stopped by a missing data set (see stop_if_missing())
+    assert len(at.error) == 0
+    assert len(at.tabs) == 4
@@ -1,5 +1,6 @@
 import datetime as dt
 
+import numpy as np
 import pandera as pa
 
 from hotels.load_data import load_booking_data
@@ -9,10 +10,10 @@ class ReservationSchema(pa.DataFrameModel):
     reservation_id: str = pa.Field(nullable=False)
     arrival_date: dt.datetime = pa.Field(nullable=False)
     adr: float = pa.Field(nullable=False)
-    adults: int = pa.Field(nullable=False)
-    children: int = pa.Field(nullable=False)
-    babies: int = pa.Field(nullable=False)
-    n_lodgers: int = pa.Field(nullable=False, ge=0)
+    adults: np.int8 = pa.Field(nullable=False)
+    children: np.int8 = pa.Field(nullable=False)
+    babies: np.int8 = pa.Field(nullable=False)
+    n_lodgers: np.int8 = pa.Field(nullable=False, ge=0)
 
 
 def test_booking_data():
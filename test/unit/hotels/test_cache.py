@@ -0,0 +1,78 @@
+import shutil
+import subprocess
+from pathlib import Path
+
+import dvc.api
+import pandas as pd
+from dvc.repo import Repo
+
+from hotels.cache import LocalDataCache, _entry_stat, parse_dvc_lock
+
+
+def make_dvc_repo(root: Path) -> dvc.api.DVCFileSystem:
+    """
+    A git repository with a DVC stage producing data/table.parquet and data/dataset.parquet (a directory).
+    The outputs are pushed to a local remote and removed from the workspace and the DVC cache,
+    so that every read goes through the remote.
+    """
+    repo_dir = root / "repo"
+    repo_dir.mkdir()
+    subprocess.run(["git", "init", "-q"], cwd=repo_dir, check=True)
+    Repo.init(str(repo_dir))
+    (repo_dir / ".dvc" / "config").write_text(
+        f"[core]\n    remote = local\n['remote \"local\"']\n    url = {root / 'remote'}\n"
+    )
+
+    (repo_dir / "data" / "dataset.parquet").mkdir(parents=True)
+    pd.DataFrame({"x": [1, 2, 3]}).to_parquet(repo_dir / "data" / "table.parquet")
+    pd.DataFrame({"y": [4, 5]}).to_parquet(repo_dir / "data" / "dataset.parquet" / "part-0.parquet")
+    (repo_dir / "dvc.yaml").write_text(
+        "stages:\n  make:\n    cmd: echo\n    outs:\n      - data/table.parquet\n      - data/dataset.parquet\n"
+    )
+
+    repo = Repo(str(repo_dir))
+    repo.commit(f"{repo_dir / 'dvc.yaml'}:make", force=True)
+    repo.push()
+    shutil.rmtree(repo_dir / ".dvc" / "cache")
+    shutil.rmtree(repo_dir / "data")
+
+    subprocess.run(["git", "add", "-A"], cwd=repo_dir, check=True)
+    subprocess.run(
+        ["git", "-c", "user.name=test", "-c", "user.email=test@example.com", "commit", "-q", "-m", "data"],
+        cwd=repo_dir,
+        check=True,
+    )
+    return dvc.api.DVCFileSystem(str(repo_dir), rev="HEAD")
+
+
+def test_local_data_cache(tmp_path: Path):
+    fs = make_dvc_repo(tmp_path)
+    lock_md5s = parse_dvc_lock(fs.read_text("/dvc.lock"))
+    cache = LocalDataCache(fs, lock_md5s, directory=tmp_path / "cache")
+
+    local_path = cache.fetch("/data/table.parquet")
+    assert local_path.parent.name == lock_md5s["data/table.parquet"]
+    assert pd.read_parquet(local_path)["x"].to_list() == [1, 2, 3]
+
+    local_dir = cache.fetch("/data/dataset.parquet")
+    assert pd.read_parquet(local_dir, memory_map=True)["y"].to_list() == [4, 5]
+
+    assert cache.fetch("/dvc.yaml") is None  ## not a DVC output
+
+    ## entries which the dvc.lock of this process refers to or which were accessed recently are kept
+    cache.max_bytes = 0
+    cache.evict()
+    assert local_path.exists() and local_dir.exists()
+
+    ## the least recently used entry (table.parquet) is evicted by a process with another dvc.lock
+    other_md5s = {"data/dataset.parquet": lock_md5s["data/dataset.parquet"]}
+    other_cache = LocalDataCache(fs, other_md5s, directory=tmp_path / "cache", min_age_sec=0)
+    other_cache.max_bytes = (local_dir / "part-0.parquet").stat().st_size
+    other_cache.evict()
+    assert not local_path.exists()
+    assert local_dir.exists()
+    assert not any(p.name.startswith(".trash-") for p in (tmp_path / "cache").iterdir())
+
+    ## an evicted entry is downloaded again. An entry which has vanished is skipped.
+    assert pd.read_parquet(cache.fetch("/data/table.parquet"))["x"].to_list() == [1, 2, 3]
+    assert _entry_stat(tmp_path / "cache" / "evicted-by-another-process") is None
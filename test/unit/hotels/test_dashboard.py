@@ -0,0 +1,37 @@
+import pandas as pd
+
+from hotels.dashboard import prepare_time_unit_data, truncate_date
+from hotels.models import TUTransform
+
+
+def test_truncate_date():
+    s_date = pd.Series(pd.to_datetime(["2015-12-31", "2016-01-02", "2016-01-03", "2016-02-29"]))
+
+    ## weeks start on Sunday and may begin in the previous year (as yearweek of Vega-Lite)
+    assert truncate_date(s_date, TUTransform.yearweek).dt.strftime("%Y-%m-%d").to_list() == [
+        "2015-12-27",
+        "2015-12-27",
+        "2016-01-03",
+        "2016-02-28",
+    ]
+    assert truncate_date(s_date, TUTransform.yearmonth).dt.day.to_list() == [1, 1, 1, 1]
+
+
+def test_prepare_time_unit_data():
+    data = pd.DataFrame(
+        {
+            "date": pd.date_range("2016-01-30", "2016-02-02"),
+            "room_type": ["A", "A", "A", "B"],
+            "occupancy_rate": [0.1, 0.3, 0.5, 0.7],
+        }
+    )
+
+    df, min_date, max_date = prepare_time_unit_data(
+        data, TUTransform.yearmonth, ["occupancy_rate"], by=("room_type",), server_side=True
+    )
+    assert (min_date, max_date) == ("min_date", "max_date")
+    assert df["occupancy_rate"].round(2).to_list() == [0.2, 0.5, 0.7]
+    assert df["max_date"].dt.day.to_list() == [31, 1, 2]
+
+    df, min_date, max_date = prepare_time_unit_data(data, TUTransform.yearmonth, ["occupancy_rate"], server_side=False)
+    assert df is data and min_date == max_date == "date"
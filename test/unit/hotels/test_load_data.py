@@ -0,0 +1,92 @@
+from pathlib import Path
+
+import pandas as pd
+import pytest
+from dvc.scm import RevError
+
+import hotels.load_data as load_data
+from hotels.models import DataSource, DtypeBackend, RawDataSource
+
+
+@pytest.fixture(autouse=True)
+def clear_data_source_caches():
+    """The filesystem, the local cache and dvc.lock are cached for the data source, which the tests patch"""
+    cached_functions = (load_data.get_filesystem, load_data.get_data_cache, load_data.get_lock_md5s)
+    for cached in cached_functions:
+        cached.cache_clear()
+    yield
+    for cached in cached_functions:
+        cached.cache_clear()
+
+
+def test_dataset_handle(tmp_path: Path, monkeypatch):
+    monkeypatch.setattr(load_data, "dvc_repo", str(tmp_path))
+    monkeypatch.setattr(load_data, "data_source", DataSource.local)
+
+    path = tmp_path / "data" / "cleaned" / "bookings.parquet"
+    path.parent.mkdir(parents=True)
+    pd.DataFrame({"hotel": ["City Hotel"]}).to_parquet(path)
+
+    handle = load_data.get_dataset_handle("bookings", hotel="City Hotel", columns=["hotel"])
+    assert handle == load_data.get_dataset_handle("bookings", hotel="City Hotel", columns=["hotel"])
+    assert hash(handle) == hash(load_data.get_dataset_handle("bookings", hotel="City Hotel", columns=["hotel"]))
+
+    ## the handle changes with the content
+    pd.DataFrame({"hotel": ["City Hotel", "Resort Hotel"]}).to_parquet(path)
+    assert handle != load_data.get_dataset_handle("bookings", hotel="City Hotel", columns=["hotel"])
+
+
+def test_pyarrow_dtype_backend(tmp_path: Path, monkeypatch):
+    monkeypatch.setattr(load_data, "dvc_repo", str(tmp_path))
+    monkeypatch.setattr(load_data, "data_source", DataSource.local)
+    monkeypatch.setattr(load_data, "get_data_cache", lambda: None)
+
+    path = tmp_path / "data" / "aggregated" / "actions.parquet"
+    path.parent.mkdir(parents=True)
+    df = pd.DataFrame(
+        {"reservation_id": ["C000001", "R000002"], "date": pd.to_datetime(["2016-01-01", "2016-01-02"]), "n": [1, 2]}
+    ).assign(action=lambda x: pd.Categorical(["arrival", "stay"]))
+    df.to_parquet(path)
+
+    monkeypatch.setattr(load_data, "dtype_backend", DtypeBackend.pyarrow)
+    df_arrow = load_data.load_action_data(columns=["reservation_id", "date", "action", "n"])
+    assert isinstance(df_arrow["reservation_id"].dtype, pd.ArrowDtype)
+    assert isinstance(df_arrow["action"].dtype, pd.CategoricalDtype)
+    assert df_arrow["date"].dtype == df["date"].dtype and df_arrow["n"].dtype == df["n"].dtype
+    assert df_arrow["reservation_id"].str.startswith("C").to_list() == [True, False]
+
+    ## the pipeline writes the same file with either dtype backend
+    pd.testing.assert_frame_equal(load_data.numpy_backed(df_arrow), df[df_arrow.columns])
+
+
+def test_load_raw_hotel_data(tmp_path: Path, monkeypatch):
+    monkeypatch.setattr(load_data, "dvc_repo", str(tmp_path))
+    monkeypatch.setattr(load_data, "data_source", DataSource.local)
+    monkeypatch.setattr(load_data, "load_pipeline_params", lambda: {"raw_data": {"source": "synthetic"}})
+
+    for source in RawDataSource:
+        path = tmp_path / "data" / "raw" / source.value / "hotels.parquet"
+        path.parent.mkdir(parents=True)
+        pd.DataFrame({"hotel": [source.value]}).to_parquet(path)
+
+    ## raw_data.source of params.yaml by default
+    assert load_data.load_raw_hotel_data()["hotel"].to_list() == ["synthetic"]
+    assert load_data.load_raw_hotel_data(RawDataSource.tidytuesday)["hotel"].to_list() == ["tidytuesday"]
+
+
+def test_require_outputs(monkeypatch):
+    monkeypatch.setattr(load_data, "data_source", DataSource.dvc)
+    monkeypatch.setattr(load_data, "get_lock_md5s", lambda: {"data/cleaned/bookings.parquet": "0123.dir"})
+
+    load_data.require_outputs(["/data/cleaned/bookings.parquet"])
+    with pytest.raises(load_data.MissingOutputsError, match="daily_facts.parquet.*dvc repro"):
+        load_data.require_outputs(["/data/cleaned/bookings.parquet", "/data/aggregated/daily_facts.parquet"])
+
+
+def test_require_outputs_unknown_revision(monkeypatch):
+    monkeypatch.setattr(load_data, "data_source", DataSource.dvc)
+    monkeypatch.setattr(load_data, "dvc_rev", "no-such-revision")
+
+    ## not reported as missing outputs
+    with pytest.raises(RevError):
+        load_data.require_outputs(["/data/cleaned/bookings.parquet"])
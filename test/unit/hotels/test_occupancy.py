@@ -0,0 +1,30 @@
+import datetime as dt
+
+import pandas as pd
+
+from hotels.occupancy import OccupancyCube
+
+
+def test_occupancy_cube():
+    df_booking = pd.DataFrame(
+        {
+            "hotel": ["City Hotel", "City Hotel", "City Hotel", "Resort Hotel"],
+            "assigned_room_type": ["A", "A", "B", "C"],
+            "is_canceled": [0, 0, 1, 0],
+            "arrival_date": pd.to_datetime(["2016-01-01", "2016-01-02", "2016-01-01", "2015-12-30"]),
+            "actual_departure_date": pd.to_datetime(["2016-01-03", "2016-01-04", pd.NaT, "2016-01-02"]),
+            "n_stay_actual": [2.0, 2.0, None, 3.0],
+        }
+    )
+
+    cube = OccupancyCube.from_bookings(df_booking, start_date=dt.date(2016, 1, 1), end_date=dt.date(2016, 1, 3))
+    df_room_usage = cube.room_usage()
+    df_room_count = cube.room_count()
+
+    ## room type B of the city hotel has only a canceled reservation
+    assert df_room_usage[["hotel", "room_type"]].drop_duplicates().values.tolist() == [
+        ["City Hotel", "A"],
+        ["Resort Hotel", "C"],
+    ]
+    assert df_room_usage["n_occupied_rooms"].to_list() == [1, 2, 1] + [1, 0, 0]
+    assert df_room_count["n_rooms"].to_list() == [2, 1]
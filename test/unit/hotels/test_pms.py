@@ -0,0 +1,131 @@
+import datetime as dt
+
+import pandas as pd
+
+from hotels.pms import ReservationIndex, aggregate_pms_snapshot, classify_flows_by_date
+
+
+def test_reservation_index_lookup():
+    df_booking = pd.DataFrame(
+        {
+            "hotel": ["City Hotel"] * 4 + ["Resort Hotel"],
+            "arrival_date": pd.to_datetime(["2016-01-01", "2016-01-03", "2016-01-03", "2016-01-05", "2016-01-03"]),
+            "actual_departure_date": pd.to_datetime(["2016-01-04", pd.NaT, "2016-01-03", pd.NaT, "2016-01-04"]),
+            "reservation_status": ["Check-Out", "Canceled", "Check-Out", "No-Show", "Check-Out"],
+            "reservation_status_date": pd.to_datetime(
+                ["2016-01-04", "2016-01-02", "2016-01-03", "2016-01-05", "2016-01-04"]
+            ),
+            "adults": [1, 2, 3, 4, 5],
+        }
+    )
+    reservation_index = ReservationIndex(df_booking)
+
+    df = reservation_index.lookup("City Hotel", pd.Timestamp("2016-01-03"))
+    ## the canceled reservation is not related. The day-use reservation is an arrival which has left in the evening.
+    assert df[["adults", "flow_type_morning", "flow_type_evening"]].values.tolist() == [
+        [1, "in-house", "in-house"],
+        [3, "arrival", "non-related"],
+    ]
+
+    df = reservation_index.lookup("City Hotel", pd.Timestamp("2016-01-04"))
+    assert df[["adults", "flow_type_morning"]].values.tolist() == [[1, "departure"]]
+
+    assert reservation_index.candidates("City Hotel", "2016-01-04", "2016-01-05")["adults"].to_list() == [1, 2, 3, 4]
+    assert reservation_index.lookup("Resort Hotel", pd.Timestamp("2016-01-02")).empty
+    assert reservation_index.lookup("Unknown Hotel", pd.Timestamp("2016-01-02")).empty
+
+
+def test_classify_flows():
+    df_booking = pd.DataFrame(
+        {
+            "arrival_date": pd.to_datetime(["2016-01-01", "2016-01-03", "2016-01-03", "2016-01-03"]),
+            "actual_departure_date": pd.to_datetime(["2016-01-03", pd.NaT, "2016-01-03", "2016-01-05"]),
+            "reservation_status": ["Check-Out", "No-Show", "Check-Out", "Check-Out"],
+            "reservation_status_date": pd.to_datetime(["2016-01-03", "2016-01-04", "2016-01-03", "2016-01-05"]),
+        },
+        index=[10, 11, 12, 13],
+    )
+
+    df_flows = classify_flows_by_date(df_booking, pd.date_range("2016-01-02", "2016-01-04"))
+    df_day = df_flows.query("date == '2016-01-03'")
+    assert df_day.index.to_list() == [10, 11, 12, 13]
+    assert df_day["flow_type_morning"].to_list() == ["departure", "arrival", "arrival", "arrival"]
+    ## a no-show remains an arrival and a day-use guest has already left in the evening
+    assert df_day["flow_type_evening"].to_list() == ["non-related", "arrival", "non-related", "in-house"]
+
+    assert df_flows.index.to_list() == [10, 10, 11, 12, 13, 13]
+    assert df_flows["date"].dt.day.to_list() == [2, 3, 3, 3, 3, 4]
+    assert df_flows["flow_type_morning"].to_list() == [
+        "in-house",
+        "departure",
+        "arrival",
+        "arrival",
+        "arrival",
+        "in-house",
+    ]
+
+
+def test_classify_flows_of_a_date():
+    df_booking = pd.DataFrame(
+        {
+            "arrival_date": pd.to_datetime(["2016-01-01", "2016-01-03"]),
+            ## the actual departure date of the second reservation is before its arrival date
+            "actual_departure_date": pd.to_datetime(["2016-01-03", "2016-01-02"]),
+            "reservation_status": ["Check-Out", "Check-Out"],
+            "reservation_status_date": pd.to_datetime(["2016-01-03", "2016-01-03"]),
+        }
+    )
+
+    df_flows = classify_flows_by_date(df_booking, pd.Timestamp("2016-01-03"))
+    assert df_flows.index.to_list() == [0, 1]
+    assert df_flows["flow_type_morning"].to_list() == ["departure", "arrival"]
+    pd.testing.assert_frame_equal(df_flows, classify_flows_by_date(df_booking, [pd.Timestamp("2016-01-03")]))
+
+    assert classify_flows_by_date(df_booking, pd.Timestamp("2016-01-02"))["flow_type_morning"].to_list() == ["in-house"]
+
+
+def test_aggregate_pms_snapshot():
+    df_booking = pd.DataFrame(
+        {
+            "hotel": ["City Hotel", "City Hotel"],
+            "arrival_date": pd.to_datetime(["2016-01-01", "2016-01-02"]),
+            "actual_departure_date": pd.to_datetime(["2016-01-03", pd.NaT]),
+            "reservation_status": ["Check-Out", "No-Show"],
+            "reservation_status_date": pd.to_datetime(["2016-01-03", "2016-01-02"]),
+            "adults": [2, 1],
+            "children": [1, 0],
+            "babies": [0, 0],
+            "n_lodgers": [3, 1],
+            "breakfast": [True, True],
+            "lunch": [False, False],
+            "dinner": [True, False],
+            "reserved_room_type": ["A", "B"],
+            "assigned_room_type": ["C", "B"],
+        }
+    )
+
+    df_flows, df_meals, df_room_usage = aggregate_pms_snapshot(
+        df_booking, start_date=dt.date(2016, 1, 1), end_date=dt.date(2016, 1, 3)
+    )
+
+    assert len(df_flows) == 3 * 2 * 3  ## dates x periods x flow types
+    df_flows = df_flows.set_index(["date", "period", "flow_type"])
+    assert df_flows.loc[("2016-01-02", "morning", "in-house"), "n_adults"] == 2
+    assert df_flows.loc[("2016-01-02", "morning", "arrival"), "n_rooms"] == 1
+    assert df_flows.loc[("2016-01-02", "evening", "arrival"), "n_rooms"] == 1  ## no-show
+    assert df_flows.loc[("2016-01-03", "evening", "departure"), "n_rooms"] == 0
+
+    assert df_meals[["n_breakfast", "n_lunch", "n_dinner"]].values.tolist() == [[0, 0, 3], [3, 0, 3], [3, 0, 0]]
+
+    df_arrival = df_room_usage.query("period == 'morning' and flow_type == 'arrival'")
+    assert df_arrival[["reserved_room_type", "assigned_room_type", "n_rooms"]].values.tolist() == [
+        ["A", "C", 1],
+        ["B", "B", 1],
+    ]
+
+    ## a hotel without reservations in the dates
+    df_flows, df_meals, _ = aggregate_pms_snapshot(
+        df_booking.iloc[:0], dt.date(2016, 1, 1), dt.date(2016, 1, 1), hotels=["Resort Hotel"]
+    )
+    assert df_flows["n_rooms"].to_list() == [0] * 2 * 3
+    assert df_meals["hotel"].to_list() == ["Resort Hotel"]
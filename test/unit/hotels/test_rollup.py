@@ -0,0 +1,40 @@
+import datetime as dt
+
+import numpy as np
+import pandas as pd
+
+from hotels.rollup import rank_categories, rollup_top_n
+
+
+def test_rollup_top_n():
+    df = pd.DataFrame(
+        {
+            "date": pd.to_datetime(
+                ["2016-01-01", "2016-01-01", "2016-01-02", "2016-01-02", "2016-01-03", "2016-01-03"]
+            ),
+            "country": pd.Categorical(
+                ["PRT", "FRA", "DEU", "PRT", "ESP", None], categories=["DEU", "ESP", "FRA", "PRT", "GBR"]
+            ),
+            "sales": [100.0, 50.0, 50.0, 10.0, 500.0, 10.0],
+        }
+    )
+
+    df_rank = rank_categories(df, "country", "sales")
+    assert df_rank["country"].to_list() == ["ESP", "PRT", "DEU", "FRA"]
+    assert df_rank["rank"].to_list() == [1, 2, 3, 3]
+
+    ## ties at the n-th rank are kept
+    s_country = rollup_top_n(df, "country", "sales", n=3)
+    assert list(s_country.cat.categories) == ["ESP", "PRT", "DEU", "FRA", "other"]
+
+    s_country = rollup_top_n(df, "country", "sales", n=1)
+    assert s_country.to_list()[:5] == ["other", "other", "other", "other", "ESP"]
+    assert s_country.isna().to_list() == [False] * 5 + [True]
+
+    ## ranking window and the number of rows as the metric
+    s_country = rollup_top_n(df, "country", n=1, end_date=dt.date(2016, 1, 2))
+    assert list(s_country.cat.categories) == ["PRT", "other"]
+
+    ## non-categorical field such as agent
+    s_agent = rollup_top_n(pd.DataFrame({"agent": [9.0, 9.0, 240.0, np.nan]}), "agent", n=1, other="others")
+    assert s_agent.to_list()[:3] == [9.0, 9.0, "others"]
@@ -0,0 +1,50 @@
+import pandas as pd
+
+from pipelines.aggregate_data import _reservation2actions, aggregate_daily_facts, reservations2actions
+
+
+def test_reservations2actions():
+    df_booking = pd.DataFrame(
+        {
+            "reservation_id": ["C000001", "C000002", "R000003"],
+            "arrival_date": pd.to_datetime(["2016-01-01", "2016-01-31", "2016-02-28"]),
+            "actual_departure_date": pd.to_datetime(["2016-01-02", "2016-02-03", "2016-03-02"]),
+            "n_stay_actual": [1.0, 3.0, 3.0],
+        }
+    )
+
+    df_expected = pd.concat(df_booking.apply(_reservation2actions, axis=1).to_list(), axis=0)
+    df_actions = reservations2actions(df_booking)
+
+    pd.testing.assert_frame_equal(df_actions, df_expected)
+    assert df_actions["action"].to_list() == ["arrival", "departure"] + ["arrival", "stay", "stay", "departure"] * 2
+
+
+def test_aggregate_daily_facts():
+    df_booking = pd.DataFrame(
+        {
+            "reservation_id": ["C000001", "C000002"],
+            "hotel": ["City Hotel", "City Hotel"],
+            "assigned_room_type": ["A", "A"],
+            "country": ["PRT", "PRT"],
+            "market_segment": ["Direct", "Direct"],
+            "adults": [2, 1],
+            "children": [0, 1],
+            "babies": [0, 0],
+            "n_lodgers": [2, 2],
+            "required_car_parking_spaces": [1, 0],
+            "adr": [100.0, 50.0],
+            "n_nights": [2, 1],
+            "n_stay_actual": [2.0, 1.0],
+            "arrival_date": pd.to_datetime(["2016-01-01", "2016-01-02"]),
+        }
+    )
+    df_actions = reservations2actions(df_booking)
+
+    df_facts = aggregate_daily_facts(df_booking, df_actions)
+
+    assert df_facts["date"].dt.day.to_list() == [1, 2, 2]
+    assert df_facts["is_family"].to_list() == [False, False, True]
+    assert df_facts["n_occupied_rooms"].to_list() == [1, 1, 1]
+    assert df_facts["n_guests"].sum() == 2 * 2 + 2
+    assert df_facts["sales"].sum() == 100.0 * 2 + 50.0
@@ -0,0 +1,113 @@
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import pipelines.clean_data as clean_data
+from hotels.load_data import booking_date_cols
+from hotels.models import Property
+from pipelines.clean_data import DataCleaner, RowwiseDataCleaner
+
+
+@pytest.fixture(autouse=True)
+def property_registry(monkeypatch):
+    registry = (Property(name="City Hotel", code="C"), Property(name="Resort Hotel", code="R"))
+    monkeypatch.setattr(clean_data, "load_property_registry", lambda: registry)
+
+
+def make_raw_data() -> pd.DataFrame:
+    return pd.DataFrame(
+        {
+            "hotel": ["City Hotel", "Resort Hotel", "City Hotel", "Resort Hotel", "City Hotel"],
+            "lead_time": [0, 12, 300, 5, 40],
+            "arrival_date_year": [2015, 2016, 2016, 2017, 2017],
+            "arrival_date_month": ["July", "February", "December", "January", "August"],
+            "arrival_date_day_of_month": [1, 29, 31, 9, 31],
+            "stays_in_weekend_nights": [0, 2, 1, 0, 1],
+            "stays_in_week_nights": [0, 3, 2, 1, 1],
+            "adults": [2, 1, 2, 0, 2],
+            "children": [0.0, np.nan, 1.0, 0.0, 0.0],
+            "babies": [0, 0, 0, 0, 1],
+            "meal": ["BB", "HB", "FB", "SC", "Undefined"],
+            "adr": [0.0, 80.5, 120.0, 60.0, 99.9],
+            "reservation_status": ["Check-Out", "Check-Out", "Canceled", "Check-Out", "No-Show"],
+            "reservation_status_date": ["2015-07-01", "2016-03-04", "2016-11-02", "2017-01-10", "2017-08-31"],
+        }
+    ).assign(
+        is_canceled=lambda x: (x["reservation_status"] != "Check-Out").astype(int),
+        country=["PRT", "GBR", None, "PRT", "DEU"],
+        market_segment="Online TA",
+        distribution_channel="TA/TO",
+        reserved_room_type=["A", "D", "A", "E", "B"],
+        assigned_room_type=["A", "D", "B", "E", "B"],
+        deposit_type="No Deposit",
+        customer_type="Transient",
+        is_repeated_guest=0,
+        previous_cancellations=0,
+        previous_bookings_not_canceled=0,
+        booking_changes=0,
+        days_in_waiting_list=0,
+        required_car_parking_spaces=[0, 1, 0, 0, 0],
+        total_of_special_requests=0,
+    )
+
+
+def test_vectorized_data_cleaner_agrees_with_rowwise():
+    df_raw = make_raw_data()
+
+    df_vectorized = DataCleaner.apply_all(df_raw)
+    pd.testing.assert_frame_equal(df_vectorized, RowwiseDataCleaner.apply_all(df_raw))
+
+    assert df_vectorized["reservation_id"].to_list() == ["C000001", "R000002", "C000003", "C000004"]
+    assert df_vectorized["n_stay_actual"].to_list()[:2] == [0, 4]
+    assert df_vectorized["is_early_departure"].to_list() == [False, True, False, False]
+    assert df_vectorized["breakfast"].dtype == bool
+    assert df_vectorized["hotel"].dtype == "category"
+
+
+def test_unknown_property():
+    df_raw = make_raw_data().assign(hotel="Castle Hotel")
+
+    with pytest.raises(ValueError, match="Castle Hotel"):
+        DataCleaner.apply_all(df_raw)
+
+
+def test_compact_dtypes_out_of_range():
+    df_raw = make_raw_data().assign(lead_time=[10, 20, 40_000, 5, 7])
+
+    with pytest.raises(ValueError, match="lead_time"):
+        DataCleaner.apply_all(df_raw)
+
+
+def test_write_partitioned_bookings(tmp_path: Path):
+    df_booking = DataCleaner.apply_all(make_raw_data())
+    output_dir = tmp_path / "bookings.parquet"
+    clean_data.write_partitioned_bookings(df_booking, output_dir)
+
+    assert sorted(p.name for p in output_dir.iterdir()) == ["hotel=City Hotel", "hotel=Resort Hotel"]
+    df_resort = pd.read_parquet(output_dir, filters=[("hotel", "==", "Resort Hotel")])
+    assert df_resort["reservation_id"].to_list() == ["R000002"]
+
+    df_read = pd.read_parquet(output_dir)
+    df_read = df_read.astype({c: "datetime64[s]" for c in booking_date_cols})
+    pd.testing.assert_frame_equal(clean_data.as_partitioned_bookings(df_booking), df_read)
+
+
+def test_parallel_data_cleaner_agrees_with_serial():
+    df_raw = make_raw_data()
+
+    pd.testing.assert_frame_equal(DataCleaner.apply_all(df_raw, workers=2), DataCleaner.apply_all(df_raw, workers=1))
+
+
+def test_measure_step():
+    def add_column(df: pd.DataFrame):
+        df["x"] = np.zeros(len(df))
+        np.ones(1_000_000)  ## 8 MB which are released before the next step
+
+    df = pd.DataFrame({"a": range(10)})
+    metrics = [clean_data._measure_step(step, add_column, df) for step in ["first", "second"]]
+
+    ## the peak is measured for each step, not for the process
+    assert all(m["peak_memory_mb"] > 7 for m in metrics)
+    assert metrics[0]["columns_added"] == ["x"] and metrics[1]["columns_added"] == []
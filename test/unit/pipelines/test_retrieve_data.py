@@ -0,0 +1,37 @@
+import pandas as pd
+import pyarrow.parquet as pq
+import pytest
+
+from pipelines.retrieve_data import stream_raw_data
+from pipelines.synthetic import raw_schema
+from test_clean_data import make_raw_data
+
+
+def test_stream_raw_data(tmp_path):
+    df_raw = make_raw_data().assign(agent=[9.0, None, 240.0, 9.0, None], company=float("nan"))
+    df_raw = df_raw.reindex(columns=raw_schema.names, fill_value=0)
+    df_raw.to_csv(tmp_path / "hotels.csv.gz", index=False)
+    output_path = tmp_path / "hotels.parquet"
+
+    stats = stream_raw_data(str(tmp_path / "hotels.csv.gz"), output_path, chunk_size=2)
+    assert (stats["rows"], stats["chunks"]) == (5, 3)
+    assert pq.ParquetFile(output_path).metadata.num_row_groups == 3
+    assert pq.read_schema(output_path).equals(raw_schema)
+
+    ## the same data as reading the whole file at once
+    pd.read_csv(tmp_path / "hotels.csv.gz").to_parquet(tmp_path / "expected.parquet")
+    pd.testing.assert_frame_equal(
+        pd.read_parquet(output_path), pd.read_parquet(tmp_path / "expected.parquet"), check_dtype=False
+    )
+
+    ## no dtype is inferred. A failed run keeps the previous file.
+    df_raw.assign(lead_time=["1", "2", "3", "4", "unknown"]).to_csv(tmp_path / "invalid.csv", index=False)
+    with pytest.raises(ValueError):
+        stream_raw_data(str(tmp_path / "invalid.csv"), output_path, chunk_size=2)
+    assert pq.ParquetFile(output_path).metadata.num_rows == 5
+    assert sorted(p.name for p in tmp_path.iterdir()) == [
+        "expected.parquet",
+        "hotels.csv.gz",
+        "hotels.parquet",
+        "invalid.csv",
+    ]
@@ -0,0 +1,38 @@
+import json
+
+import pandas as pd
+import pyarrow as pa
+
+import pipelines.clean_data as clean_data
+from hotels.models import Property
+from pipelines.clean_data import DataCleaner
+from pipelines.synthetic import fit_profile, generate_raw_data, raw_schema
+from test_clean_data import make_raw_data
+
+
+def test_generate_raw_data(monkeypatch):
+    df_raw = make_raw_data().assign(agent=[9.0, None, 240.0, 9.0, None], company=float("nan"))
+    profile = json.loads(json.dumps(fit_profile(df_raw)))
+    properties = ["Resort Hotel", "Castle Hotel", "City Hotel"]
+
+    df_synthetic = pd.concat(generate_raw_data(profile, 40, properties, seed=1, chunk_size=50), ignore_index=True)
+    pd.testing.assert_frame_equal(
+        df_synthetic, pd.concat(generate_raw_data(profile, 40, properties, seed=1, chunk_size=50), ignore_index=True)
+    )
+
+    ## schema of hotels.parquet
+    assert df_synthetic.columns.to_list() == raw_schema.names
+    pa.Table.from_pandas(df_synthetic, schema=raw_schema, preserve_index=False)
+
+    ## Castle Hotel is modeled after the second hotel of the profile (Resort Hotel)
+    assert df_synthetic["hotel"].value_counts().to_dict() == {"City Hotel": 120, "Resort Hotel": 80, "Castle Hotel": 80}
+    assert set(df_synthetic["country"].dropna()) <= set(df_raw["country"].dropna())
+    n_nights = df_synthetic["stays_in_weekend_nights"] + df_synthetic["stays_in_week_nights"]
+    assert set(n_nights) <= set(df_raw["stays_in_weekend_nights"] + df_raw["stays_in_week_nights"])
+    assert (df_synthetic["stays_in_week_nights"] >= 0).all()
+
+    registry = tuple(Property(name=hotel, code=hotel[:2]) for hotel in properties)
+    monkeypatch.setattr(clean_data, "load_property_registry", lambda: registry)
+    df_booking = DataCleaner.apply_all(df_synthetic)
+    assert (df_booking["reservation_date"] <= df_booking["arrival_date"]).all()
+    assert (df_booking.query("reservation_status == 'Canceled'").eval("reservation_status_date <= arrival_date")).all()